@@ -0,0 +1,199 @@
+import argparse
+import itertools
+import sys
+import time
+
+from history import ALL_GUILDS, HandHistory
+from settlement import OUTCOMES
+from snapshots import SnapshotStore, snapshot_path, snapshot_shards
+from storage import GUILD_ECONOMIES, STARTING_CHIPS, STORE_BACKEND, open_store, partition_ids
+
+# Players checked per step - each batch costs one merged read of the balance
+# and stats records plus one totals query against the history
+AUDIT_BATCH_SIZE = 1000
+
+# Seconds to wait before re-checking the players a first pass flagged. Against
+# a running bot a settlement can land between reading a balance and reading the
+# history, and JSON stores buffer changes, so only discrepancies that survive a
+# second look are reported.
+RECHECK_DELAY = 5
+
+WIN_RESULTS = [result for result, outcome in OUTCOMES.items() if outcome in ("win", "blackjack")]
+LOSS_RESULTS = [result for result, outcome in OUTCOMES.items() if outcome == "lose"]
+
+# One failed check for one player
+class Discrepancy:
+    def __init__(self, guild_id, user_id, check, detail):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.check = check
+        self.detail = detail
+
+    def __str__(self):
+        where = f"guild {self.guild_id}" if self.guild_id else "global"
+        return f"[{where}] {self.user_id} {self.check}: {self.detail}"
+
+# Every player in a store as (user_id, player record, stats record), either
+# record None when missing. Both are streamed in user_id order and merged, so
+# nothing but the current batches is held.
+def paired_records(store, batch_size):
+    players = itertools.chain.from_iterable(store.iter_players(batch_size))
+    stats = itertools.chain.from_iterable(store.iter_stats(batch_size))
+    player = next(players, None)
+    stat = next(stats, None)
+    while player or stat:
+        if stat is None or (player and player[0] < stat[0]):
+            yield player[0], player[1], None
+            player = next(players, None)
+        elif player is None or stat[0] < player[0]:
+            yield stat[0], None, stat[1]
+            stat = next(stats, None)
+        else:
+            yield player[0], player[1], stat[1]
+            player = next(players, None)
+            stat = next(stats, None)
+
+# The history rows that count towards a store's balances - a guild's own rows,
+# DM rows for the global store with guild economies, otherwise everything
+def history_scope(guild_id):
+    if guild_id is not None:
+        return guild_id
+    return None if GUILD_ECONOMIES else ALL_GUILDS
+
+# What the history says a player should hold, as (chips, wins, losses)
+def ledger_totals(hands, grants):
+    hand_count, net, hand_wins, hand_losses = hands or (0, 0, 0, 0)
+    grant_chips, grant_wins, grant_losses = grants or (0, 0, 0)
+    return STARTING_CHIPS + net + grant_chips, hand_wins + grant_wins, hand_losses + grant_losses
+
+def check_player(guild_id, user_id, player, stats, hands, grants, in_play):
+    problems = []
+    def problem(check, detail):
+        problems.append(Discrepancy(guild_id, user_id, check, detail))
+
+    if player is None:
+        problem("orphan_stats", f"stats {stats['wins']}W/{stats['losses']}L but no player record")
+        return problems
+
+    wins, losses = player.get("wins", 0), player.get("losses", 0)
+    if player["chips"] < 0:
+        problem("negative_chips", f"balance is {player['chips']}")
+
+    stats_wins, stats_losses = (stats["wins"], stats["losses"]) if stats else (0, 0)
+    if (wins, losses) != (stats_wins, stats_losses):
+        problem("counters", f"player_data has {wins}W/{losses}L, blackjack_data has {stats_wins}W/{stats_losses}L")
+
+    chips, ledger_wins, ledger_losses = ledger_totals(hands, grants)
+    # A game in flight has taken its bet without settling yet
+    if user_id not in in_play and player["chips"] != chips:
+        problem("ledger", f"balance is {player['chips']} but hands and grants add up to {chips} ({player['chips'] - chips:+})")
+    if (wins, losses) != (ledger_wins, ledger_losses):
+        problem("history", f"player_data has {wins}W/{losses}L but the hand history has {ledger_wins}W/{ledger_losses}L")
+    return problems
+
+# Check one batch of (user_id, player, stats) against the history
+def check_batch(history, guild_id, batch, in_play):
+    user_ids = [int(user_id) for user_id, player, stats in batch]
+    hands, grants = history.totals(user_ids, history_scope(guild_id), WIN_RESULTS, LOSS_RESULTS)
+    problems = []
+    for user_id, player, stats in batch:
+        problems += check_player(guild_id, user_id, player, stats, hands.get(int(user_id)), grants.get(int(user_id)), in_play)
+    return problems
+
+def batched(records, batch_size):
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+# Check every player in every (guild_id, store), yielding discrepancies as
+# they are found. `in_play` holds user ids with a game in flight, whose
+# balances are short by their bet until it settles.
+def audit_stores(stores, history, in_play, batch_size=AUDIT_BATCH_SIZE):
+    for guild_id, store in stores:
+        for batch in batched(paired_records(store, batch_size), batch_size):
+            yield from check_batch(history, guild_id, batch, in_play)
+
+# A first pass over everything, then a second look at the flagged players only
+def audit(stores, history, in_play, batch_size=AUDIT_BATCH_SIZE, recheck_delay=RECHECK_DELAY):
+    if not recheck_delay:
+        yield from audit_stores(stores, history, in_play, batch_size)
+        return
+
+    stores = dict(stores)
+    flagged = {}
+    for problem in audit_stores(stores.items(), history, in_play, batch_size):
+        flagged.setdefault(problem.guild_id, set()).add(problem.user_id)
+    if not flagged:
+        return
+
+    time.sleep(recheck_delay)
+    for guild_id, user_ids in flagged.items():
+        store = stores[guild_id]
+        batch = [(user_id, store.player(user_id), store.user_stats(user_id)) for user_id in sorted(user_ids)]
+        for chunk in batched(iter(batch), batch_size):
+            yield from check_batch(history, guild_id, chunk, in_play)
+
+# Record an "opening" grant for every player whose balance or counters don't
+# match the history, so later audits only report new drift. Returns how many
+# players were adjusted.
+def write_baseline(stores, history, in_play, batch_size=AUDIT_BATCH_SIZE):
+    adjusted = 0
+    now = time.time()
+    for guild_id, store in stores:
+        for batch in batched(paired_records(store, batch_size), batch_size):
+            user_ids = [int(user_id) for user_id, player, stats in batch]
+            hands, grants = history.totals(user_ids, history_scope(guild_id), WIN_RESULTS, LOSS_RESULTS)
+            openings = []
+            for user_id, player, stats in batch:
+                if player is None or user_id in in_play:
+                    continue
+                chips, wins, losses = ledger_totals(hands.get(int(user_id)), grants.get(int(user_id)))
+                offsets = (player["chips"] - chips, player.get("wins", 0) - wins, player.get("losses", 0) - losses)
+                if any(offsets):
+                    openings.append((int(user_id), guild_id, now, "opening") + offsets)
+            history.record_grants(openings)
+            adjusted += len(openings)
+    return adjusted
+
+# Users whose game is in flight according to the shared game locks and the
+# shard snapshots on disk (the only trace of a game while the bot is down)
+def games_in_play(store):
+    user_ids = {name.split(":", 1)[1] for name in store.held_locks("game:")}
+    for shard_id in snapshot_shards():
+        snapshots = SnapshotStore(snapshot_path(shard_id))
+        user_ids.update(str(user_id) for user_id, version, state in snapshots.read_all())
+        snapshots.close()
+    return user_ids
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile balances and stats against the hand history")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default=STORE_BACKEND)
+    parser.add_argument("--batch-size", type=int, default=AUDIT_BATCH_SIZE)
+    parser.add_argument("--recheck", type=float, default=RECHECK_DELAY, metavar="SECONDS",
+                        help="wait before re-checking flagged players (0 reports the first pass as is)")
+    parser.add_argument("--baseline", action="store_true",
+                        help="record opening grants so the current balances become the reconciled starting point")
+    args = parser.parse_args()
+
+    stores = [(guild_id, open_store(args.backend, guild_id, write_behind=False)) for guild_id in [None] + partition_ids(args.backend)]
+    history = HandHistory()
+    in_play = games_in_play(stores[0][1])
+
+    if args.baseline:
+        adjusted = write_baseline(stores, history, in_play, args.batch_size)
+        print(f"Recorded opening balances for {adjusted} player(s)")
+        return
+
+    found = 0
+    for problem in audit(stores, history, in_play, args.batch_size, args.recheck):
+        print(problem)
+        found += 1
+    if in_play:
+        print(f"Skipped balance checks for {len(in_play)} player(s) with a game in progress")
+    print(f"{found} discrepancy(s) found")
+    sys.exit(1 if found else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import datetime
+import glob
+import gzip
+import io
+import json
+import os
+
+from storage import STORE_BACKEND, all_stores, open_store
+
+# zstd compresses faster and smaller than gzip but needs the zstandard package
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Where backups go, how often the bot takes them (0 turns that off) and how
+# many generations of each store are kept
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_INTERVAL = float(os.getenv('BACKUP_INTERVAL', '3600'))
+BACKUP_GENERATIONS = int(os.getenv('BACKUP_GENERATIONS', '24'))
+BACKUP_COMPRESSION = os.getenv('BACKUP_COMPRESSION', 'zstd' if zstandard else 'gzip')
+
+EXTENSIONS = {"gzip": ".json.gz", "zstd": ".json.zst"}
+
+# Lock name in the shared store - with several bot processes on one SQLite
+# store only the holder takes backups
+BACKUP_LOCK = "backup"
+
+# Backups are named balances-<global or guild id>-<UTC time>, so names sort by age
+def backup_prefix(guild_id):
+    return f"balances-{guild_id or 'global'}-"
+
+def backup_path(directory, guild_id, taken_at, compression):
+    return os.path.join(directory, f"{backup_prefix(guild_id)}{taken_at:%Y%m%dT%H%M%S%f}{EXTENSIONS[compression]}")
+
+def compression_for(path):
+    for compression, extension in EXTENSIONS.items():
+        if path.endswith(extension):
+            return compression
+    raise ValueError(f"Not a backup file: {path}")
+
+# Compressed text streams, so a backup is never held in memory as one string
+def _compressed_writer(raw, compression):
+    if compression == "zstd":
+        stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+    else:
+        stream = gzip.GzipFile(fileobj=raw, mode="wb")
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+def _compressed_reader(raw, compression):
+    if compression == "zstd":
+        stream = zstandard.ZstdDecompressor().stream_reader(raw)
+    else:
+        stream = gzip.GzipFile(fileobj=raw, mode="rb")
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+# Snapshot a store and write it out compressed. The snapshot is the only step
+# that touches the store; compressing and writing happen after it, on a temp
+# file that is swapped in once complete.
+def write_backup(store, guild_id, directory=BACKUP_DIR, compression=BACKUP_COMPRESSION, generations=BACKUP_GENERATIONS):
+    taken_at = datetime.datetime.now(datetime.timezone.utc)
+    players, stats = store.snapshot()
+
+    os.makedirs(directory, exist_ok=True)
+    path = backup_path(directory, guild_id, taken_at, compression)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as raw:
+        with _compressed_writer(raw, compression) as text:
+            json.dump({"guild_id": guild_id, "taken_at": taken_at.isoformat(), "players": players, "stats": stats}, text)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+
+    rotate(directory, guild_id, generations)
+    return path
+
+# Delete all but the newest `generations` backups of a store
+def rotate(directory, guild_id, generations):
+    for path in list_backups(directory, backup_prefix(guild_id))[:-max(generations, 1)]:
+        os.remove(path)
+
+# Backups whose name starts with a prefix (every store's by default), oldest first
+def list_backups(directory=BACKUP_DIR, prefix="balances-"):
+    return sorted(
+        path for path in glob.glob(os.path.join(glob.escape(directory), f"{prefix}*"))
+        if path.endswith(tuple(EXTENSIONS.values()))
+    )
+
+def read_backup(path):
+    with open(path, "rb") as raw, _compressed_reader(raw, compression_for(path)) as text:
+        return json.load(text)
+
+# Put a backup's records back into the store it was taken from
+def restore_backup(path, backend=STORE_BACKEND):
+    backup = read_backup(path)
+    store = open_store(backend, backup["guild_id"], write_behind=False)
+    try:
+        store.restore(backup["players"], backup["stats"])
+    finally:
+        store.close()
+    return backup
+
+# Back up every balance store this process serves, if it holds the backup lock.
+# The lock outlives one interval, so a process that stops taking backups hands
+# over to another once it lapses.
+def backup_stores(owner, directory=BACKUP_DIR):
+    stores = all_stores()
+    global_store = stores[0][1]
+    if not global_store.acquire_lock(BACKUP_LOCK, owner, BACKUP_INTERVAL * 1.5):
+        return []
+    return [write_backup(store, guild_id, directory) for guild_id, store in stores]
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up and restore chip balances and stats")
+    parser.add_argument("--dir", default=BACKUP_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("backup", help="back up every store now")
+    commands.add_parser("list", help="list backups, oldest first")
+    restore = commands.add_parser("restore", help="restore a store from a backup (stop the bot first when using the json store)")
+    restore.add_argument("path")
+    restore.add_argument("--backend", choices=("json", "sqlite"), default=STORE_BACKEND)
+    args = parser.parse_args()
+
+    if args.command == "backup":
+        for guild_id, store in all_stores():
+            print(write_backup(store, guild_id, args.dir))
+    elif args.command == "list":
+        for path in list_backups(args.dir):
+            print(path)
+    elif args.command == "restore":
+        backup = restore_backup(args.path, args.backend)
+        where = f"guild {backup['guild_id']}" if backup["guild_id"] else "the global store"
+        print(f"Restored {len(backup['players'])} players to {where} from {backup['taken_at']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import functools
+import io
+import os
+
+from engine import CARD_INDEX
+
+# CARD_IMAGES=1 shows hands as a picture instead of card glyphs, which every
+# client draws differently. CARD_ATLAS can point at a PNG laid out like the
+# built-in atlas (13 ranks across; spades, hearts, diamonds, clubs, then the
+# card back down) to use other card art.
+CARD_IMAGES = os.getenv('CARD_IMAGES', '0') == '1'
+CARD_ATLAS = os.getenv('CARD_ATLAS')
+
+# Drawing the table needs Pillow, which glyph mode doesn't - and doesn't pay
+# to import either
+Image = None
+if CARD_IMAGES:
+    try:
+        from PIL import Image, ImageDraw, ImageFont
+    except ImportError:
+        pass
+
+if CARD_IMAGES and Image is None:
+    print('Warning: CARD_IMAGES=1 needs Pillow (pip install pillow) - showing card glyphs instead')
+    CARD_IMAGES = False
+
+# Finished table pictures kept, keyed by the hands they show
+IMAGE_CACHE_SIZE = int(os.getenv('CARD_IMAGE_CACHE', '1024'))
+
+# Rows of cards kept for reuse - the same dealer row (up card and card back)
+# sits above every move of a game, and a split hand that isn't being played
+# looks the same move after move
+ROW_CACHE_SIZE = 4096
+
+CARD_WIDTH = 72
+CARD_HEIGHT = 100
+CARD_GAP = 8
+MARGIN = 12
+TABLE_COLOR = (21, 96, 54)
+
+RANKS = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
+SUITS = ["spades", "hearts", "diamonds", "clubs"]
+RED_SUITS = ("hearts", "diamonds")
+
+# Sprite index of the card back, after the 52 faces
+CARD_BACK = 52
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow before 10.1 only has the small bitmap font
+        return ImageFont.load_default()
+
+# Suits are drawn as shapes, since the default font has no suit glyphs
+def _draw_suit(draw, suit, cx, cy, size, fill):
+    r = size / 4
+    if suit == "diamonds":
+        draw.polygon([(cx, cy - size / 2), (cx + size / 2.6, cy), (cx, cy + size / 2), (cx - size / 2.6, cy)], fill=fill)
+    elif suit == "hearts":
+        draw.ellipse([cx - 2 * r, cy - 1.6 * r, cx, cy + 0.4 * r], fill=fill)
+        draw.ellipse([cx, cy - 1.6 * r, cx + 2 * r, cy + 0.4 * r], fill=fill)
+        draw.polygon([(cx - 1.95 * r, cy - 0.3 * r), (cx + 1.95 * r, cy - 0.3 * r), (cx, cy + 2 * r)], fill=fill)
+    elif suit == "spades":
+        draw.ellipse([cx - 2 * r, cy - 0.6 * r, cx, cy + 1.4 * r], fill=fill)
+        draw.ellipse([cx, cy - 0.6 * r, cx + 2 * r, cy + 1.4 * r], fill=fill)
+        draw.polygon([(cx - 1.95 * r, cy + 0.5 * r), (cx + 1.95 * r, cy + 0.5 * r), (cx, cy - 2 * r)], fill=fill)
+        draw.polygon([(cx, cy + 0.6 * r), (cx - r, cy + 2 * r), (cx + r, cy + 2 * r)], fill=fill)
+    else:
+        for dx, dy in ((0, -0.9), (-0.95, 0.4), (0.95, 0.4)):
+            draw.ellipse([cx + (dx - 0.9) * r, cy + (dy - 0.9) * r, cx + (dx + 0.9) * r, cy + (dy + 0.9) * r], fill=fill)
+        draw.polygon([(cx, cy), (cx - r, cy + 2 * r), (cx + r, cy + 2 * r)], fill=fill)
+
+def _draw_face(rank, suit):
+    card = Image.new("RGBA", (CARD_WIDTH, CARD_HEIGHT), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(card)
+    draw.rounded_rectangle([0, 0, CARD_WIDTH - 1, CARD_HEIGHT - 1], radius=8, fill="white", outline=(60, 60, 60), width=2)
+    color = (200, 30, 40) if suit in RED_SUITS else (20, 20, 20)
+    font = _font(20)
+    draw.text((7, 4), rank, font=font, fill=color)
+    _draw_suit(draw, suit, 15, 38, 14, color)
+    _draw_suit(draw, suit, CARD_WIDTH / 2 + 6, CARD_HEIGHT / 2 + 12, 36, color)
+    return card
+
+def _draw_back():
+    card = Image.new("RGBA", (CARD_WIDTH, CARD_HEIGHT), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(card)
+    draw.rounded_rectangle([0, 0, CARD_WIDTH - 1, CARD_HEIGHT - 1], radius=8, fill=(150, 25, 35), outline="white", width=3)
+    for offset in range(-CARD_HEIGHT, CARD_WIDTH, 10):
+        draw.line([(offset, 0), (offset + CARD_HEIGHT, CARD_HEIGHT)], fill=(175, 55, 60), width=2)
+    draw.rounded_rectangle([0, 0, CARD_WIDTH - 1, CARD_HEIGHT - 1], radius=8, outline="white", width=3)
+    return card
+
+# One image holding every face and the card back
+def build_atlas():
+    atlas = Image.new("RGBA", (CARD_WIDTH * len(RANKS), CARD_HEIGHT * (len(SUITS) + 1)), (0, 0, 0, 0))
+    for row, suit in enumerate(SUITS):
+        for column, rank in enumerate(RANKS):
+            atlas.paste(_draw_face(rank, suit), (column * CARD_WIDTH, row * CARD_HEIGHT))
+    atlas.paste(_draw_back(), (0, len(SUITS) * CARD_HEIGHT))
+    return atlas
+
+# Sprites cut from the atlas once, indexed like the deck (CARD_INDEX), with the
+# card back last
+@functools.lru_cache(maxsize=1)
+def sprites():
+    atlas = Image.open(CARD_ATLAS).convert("RGBA") if CARD_ATLAS else build_atlas()
+    width, height = atlas.width // len(RANKS), atlas.height // (len(SUITS) + 1)
+    cut = [
+        atlas.crop((column * width, row * height, (column + 1) * width, (row + 1) * height))
+        for row in range(len(SUITS) + 1) for column in range(len(RANKS))
+    ]
+    cut = cut[:len(SUITS) * len(RANKS)] + [cut[len(SUITS) * len(RANKS)]]
+    return [sprite.resize((CARD_WIDTH, CARD_HEIGHT)) if sprite.size != (CARD_WIDTH, CARD_HEIGHT) else sprite for sprite in cut]
+
+# A row of card sprites by index, on a transparent strip
+@functools.lru_cache(maxsize=ROW_CACHE_SIZE)
+def render_row(cards):
+    row = Image.new("RGBA", (len(cards) * (CARD_WIDTH + CARD_GAP) - CARD_GAP, CARD_HEIGHT), (0, 0, 0, 0))
+    card_sprites = sprites()
+    for i, card in enumerate(cards):
+        row.paste(card_sprites[card], (i * (CARD_WIDTH + CARD_GAP), 0))
+    return row
+
+# The dealer's row on top and the player's hands below, as PNG bytes. Hands
+# are tuples of card glyphs; hide_dealer shows the dealer's hole card face down.
+@functools.lru_cache(maxsize=IMAGE_CACHE_SIZE)
+def render_table(player_hands, dealer_hand, hide_dealer):
+    dealer_cards = (CARD_INDEX[dealer_hand[0]], CARD_BACK) if hide_dealer else tuple(CARD_INDEX[card] for card in dealer_hand)
+    rows = [render_row(dealer_cards)] + [render_row(tuple(CARD_INDEX[card] for card in hand)) for hand in player_hands]
+
+    width = max(row.width for row in rows) + 2 * MARGIN
+    height = len(rows) * (CARD_HEIGHT + MARGIN) + MARGIN
+    table = Image.new("RGB", (width, height), TABLE_COLOR)
+    for i, row in enumerate(rows):
+        table.paste(row, (MARGIN, MARGIN + i * (CARD_HEIGHT + MARGIN)), row)
+
+    # Fast compression - the picture is small and redrawn on every move
+    output = io.BytesIO()
+    table.save(output, format="PNG", compress_level=1)
+    return output.getvalue()
@@ -0,0 +1,80 @@
+import asyncio
+import io
+
+import discord
+from discord.ext import commands
+
+from audit import audit
+from gamestate import hand_history, shard_states
+from storage import all_stores, flush_stores, store
+
+# Operator commands: $bjaudit and $bjshards, for the bot's owner only
+
+# Reconcile every balance and stat counter against the hand history and grants
+# while the bot keeps running, and post whatever doesn't add up
+AUDIT_REPORT_LINES = 15
+
+def run_audit(in_play):
+    flush_stores()
+    return [str(problem) for problem in audit(all_stores(), hand_history, in_play)]
+
+@commands.command()
+@commands.is_owner()
+async def bjaudit(ctx):
+    await ctx.send("🔍 Auditing balances against the hand history...")
+
+    # Games in flight here or on other shards have taken bets that aren't settled yet
+    in_play = {name.split(":", 1)[1] for name in store.held_locks("game:")}
+    for state in shard_states.values():
+        in_play.update(str(user_id) for user_id in state.active_games)
+        for table in state.tables.values():
+            in_play.update(str(user_id) for user_id in table.seats)
+
+    problems = await asyncio.to_thread(run_audit, in_play)
+    if not problems:
+        await ctx.send("✅ Audit passed - every balance and stat matches the hand history!")
+        return
+
+    report = "\n".join(problems[:AUDIT_REPORT_LINES])
+    message = f"⚠️ Audit found **{len(problems)}** discrepancies:\n```\n{report}\n```"
+    if len(problems) > AUDIT_REPORT_LINES:
+        full_report = discord.File(io.BytesIO("\n".join(problems).encode()), filename="audit.txt")
+        await ctx.send(message + "Full report attached.", file=full_report)
+    else:
+        await ctx.send(message)
+
+# Per-shard metrics for the shards this process runs
+@commands.command()
+@commands.is_owner()
+async def bjshards(ctx):
+    embed = discord.Embed(
+        title="🧩 Blackjack Shards",
+        description=f"{len(ctx.bot.shards)} shard(s) in this process, {ctx.bot.shard_count} total",
+        color=0x00ff00
+    )
+
+    for shard_id, shard in sorted(ctx.bot.shards.items()):
+        guilds = sum(1 for guild in ctx.bot.guilds if guild.shard_id == shard_id)
+        state = shard_states.get(shard_id)
+        if state:
+            games = len(state.active_games)
+            tables = len(state.tables)
+            split_games = sum(1 for game in state.active_games.values() if game.split)
+            counters = f"Started: {state.games_started} | Actions: {state.actions} | Hands settled: {state.hands_settled}"
+        else:
+            games = tables = split_games = 0
+            counters = "No games yet"
+
+        embed.add_field(
+            name=f"Shard {shard_id}",
+            value=f"Guilds: {guilds} | Latency: {shard.latency * 1000:.0f}ms\n"
+                  f"Games: {games} | Tables: {tables} | Split games: {split_games}\n"
+                  f"{counters}",
+            inline=False
+        )
+
+    await ctx.send(embed=embed)
+
+async def setup(bot):
+    bot.add_command(bjaudit)
+    bot.add_command(bjshards)
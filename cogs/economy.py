@@ -0,0 +1,57 @@
+import asyncio
+
+import discord
+from discord.ext import commands
+
+from gamestate import RESTART_MESSAGE, guild_id_for, hand_history
+from storage import DAILY_CHIPS, claim_daily, get_player, grant_chips
+
+# Chip commands: $chips, $daily and $bjadmin
+
+@commands.hybrid_command(description="Check your chip balance")
+async def chips(ctx):
+    await ctx.defer()
+
+    player = await asyncio.to_thread(get_player, ctx.author.id, guild_id_for(ctx))
+    chips = player["chips"]
+    await ctx.send(f"💰 {ctx.author.display_name} has **{chips}** chips!")
+
+@commands.hybrid_command(description="Claim your daily chip bonus")
+async def daily(ctx):
+    await ctx.defer()
+
+    # Chips granted while a shutdown drains could miss the final flush
+    if ctx.bot.draining:
+        await ctx.send(RESTART_MESSAGE)
+        return
+
+    claimed, chips = await asyncio.to_thread(claim_daily, ctx.author.id, guild_id_for(ctx))
+    if not claimed:
+        await ctx.send("You've already claimed your daily chips today! Come back tomorrow.")
+        return
+    await asyncio.to_thread(hand_history.record_grant, ctx.author.id, guild_id_for(ctx), "daily", DAILY_CHIPS)
+
+    await ctx.send(f"💰 {ctx.author.display_name} claimed {DAILY_CHIPS} daily chips! You now have **{chips}** chips!")
+
+@commands.command()
+async def bjadmin(ctx, user: discord.Member = None):
+    if ctx.bot.draining:
+        await ctx.send(RESTART_MESSAGE)
+        return
+
+    # If no user is mentioned, give chips to the command author
+    target_user = user if user else ctx.author
+
+    # Add 500 chips
+    chips = grant_chips(target_user.id, 500, guild_id_for(ctx))
+    hand_history.record_grant(target_user.id, guild_id_for(ctx), "admin", 500)
+
+    if user:
+        await ctx.send(f"🔧 Admin: Added 500 chips to {target_user.display_name}! They now have **{chips}** chips!")
+    else:
+        await ctx.send(f"🔧 Admin: Added 500 chips to {ctx.author.display_name}! You now have **{chips}** chips!")
+
+async def setup(bot):
+    bot.add_command(chips)
+    bot.add_command(daily)
+    bot.add_command(bjadmin)
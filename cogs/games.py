@@ -0,0 +1,500 @@
+import asyncio
+import io
+import random
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+from discord.ui import Button
+
+from cardimages import CARD_IMAGES, render_table, sprites
+from engine import ACTION_CODES, BlackjackGame
+from events import emit
+from gamestate import BET_AMOUNTS, GAME_BUTTONS, GAME_LOCK_TTL, RESTART_MESSAGE, GuardedItem, drop_game, edit_queue, game_lock, guild_id_for, hand_history, in_flight, state_for
+from render import GameView, ResultView, SplitResultView, SplitView, TABLE_IMAGE, hand_of, render_game, render_result, render_split, render_split_result
+from settlement import settle_game
+from storage import debit_chips, get_player, store
+
+# Single-player games: the bet menu, game and rematch buttons, the move
+# handlers and the end of game message, plus $blackjack and $bjhelp.
+# Games themselves live in gamestate, so reloading this extension swaps the
+# handlers without touching a game in flight.
+
+# Draw the hands into a picture for an embed, returning the edit arguments
+# that attach it (none in glyph mode). The render module points image-mode
+# embeds at the attachment. Drawing runs in a worker thread, and hands already
+# drawn come straight from the cache.
+async def table_image(player_hands, dealer_hand, hide_dealer):
+    if not CARD_IMAGES:
+        return {}
+    png = await asyncio.to_thread(render_table, tuple(tuple(hand) for hand in player_hands), tuple(dealer_hand), hide_dealer)
+    return {"attachments": [discord.File(io.BytesIO(png), filename=TABLE_IMAGE)]}
+
+# Show a game in play - its hand, or every split hand with the active one
+# marked - with buttons for the moves open to it
+async def show_game(interaction, game):
+    if game.split:
+        embed = render_split(SplitView(
+            interaction.user.display_name,
+            tuple(hand_of(hand) for hand in game.split["hands"]),
+            tuple(game.split["bets"]),
+            game.split["active"],
+            hand_of(game.dealer_hand)
+        ))
+    else:
+        embed = render_game(GameView(interaction.user.display_name, hand_of(game.player_hand), hand_of(game.dealer_hand), True))
+    image = await table_image(game.hands(), game.dealer_hand, True)
+    await edit_queue.submit(interaction, embed=embed, view=BlackjackButtonView(game), **image)
+
+# Start a new game for the interaction user and show the opening hand
+@in_flight.track
+async def start_game(interaction, bet_amount):
+    user_id = str(interaction.user.id)
+    state = state_for(interaction)
+
+    # Check if user already has an active game, here or on another shard
+    if interaction.user.id in state.active_games or not store.acquire_lock(game_lock(user_id), state.lock_owner, GAME_LOCK_TTL):
+        await interaction.response.send_message("You already have an active blackjack game!", ephemeral=True)
+        return
+
+    # Deduct bet from player chips if they can cover it
+    success, chips = debit_chips(user_id, bet_amount, interaction.guild_id)
+    if not success:
+        store.release_lock(game_lock(user_id), state.lock_owner)
+        await interaction.response.send_message(f"You don't have enough chips! You have {chips} chips.", ephemeral=True)
+        return
+    emit("bet", user_id=user_id, guild_id=interaction.guild_id, bet=bet_amount, chips=chips)
+
+    # Create new game
+    game = BlackjackGame(interaction.user.id, bet_amount)
+    state.active_games[interaction.user.id] = game
+    state.games_started += 1
+    emit("deal", user_id=user_id, game_id=game.game_id, seed=game.seed, player="".join(game.player_hand), dealer_up=game.dealer_hand[0])
+
+    # Check for immediate blackjack
+    hands = game.dealt_result()
+    if hands:
+        await finish_game(interaction, game, hands)
+    else:
+        # Normal game start
+        await show_game(interaction, game)
+
+# Bet selection buttons
+class BetButton(GuardedItem, discord.ui.DynamicItem[Button], template=r'bj:bet:(?P<amount>[0-9]+)'):
+    def __init__(self, bet_amount):
+        super().__init__(Button(label=f"{bet_amount} Chips", style=discord.ButtonStyle.primary, custom_id=f"bj:bet:{bet_amount}"))
+        self.bet_amount = bet_amount
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match['amount']))
+
+    async def callback(self, interaction: discord.Interaction):
+        if self.bet_amount not in BET_AMOUNTS:
+            await interaction.response.send_message("That bet is no longer available!", ephemeral=True)
+            return
+        await start_game(interaction, self.bet_amount)
+
+class BetSelectionView(discord.ui.View):
+    def __init__(self, user_chips):
+        super().__init__(timeout=None)
+
+        # Add bet buttons based on available chips
+        for bet_amount in BET_AMOUNTS:
+            if user_chips >= bet_amount:
+                self.add_item(BetButton(bet_amount))
+
+# Game action buttons - the custom_id carries the action, the owner, the game id and
+# the game version it was drawn at, so clicks are routed by dispatch_game_action
+# without a view object per message. Buttons drawn before versions were added
+# have no version and skip that check.
+class GameButton(GuardedItem, discord.ui.DynamicItem[Button], template=r'bj:(?P<action>hit|stand|forfeit|double|split):(?P<user_id>[0-9]+):(?P<game_id>[0-9]+)(?::(?P<version>[0-9]+))?'):
+    def __init__(self, action, user_id, game_id, version=None):
+        label, style, emoji = GAME_BUTTONS[action]
+        custom_id = f"bj:{action}:{user_id}:{game_id}" if version is None else f"bj:{action}:{user_id}:{game_id}:{version}"
+        super().__init__(Button(label=label, style=style, emoji=emoji, custom_id=custom_id))
+        self.action = action
+        self.user_id = user_id
+        self.game_id = game_id
+        self.version = version
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        version = int(match['version']) if match['version'] else None
+        return cls(match['action'], int(match['user_id']), int(match['game_id']), version)
+
+    async def callback(self, interaction: discord.Interaction):
+        await dispatch_game_action(interaction, self.action, self.user_id, self.game_id, self.version)
+
+class BlackjackButtonView(discord.ui.View):
+    def __init__(self, game):
+        super().__init__(timeout=None)
+
+        # All buttons will be on row 0 by default
+        for action in game.moves():
+            self.add_item(GameButton(action, game.user_id, game.game_id, game.version))
+
+# Route a game button click to its handler
+@in_flight.track
+async def dispatch_game_action(interaction, action, user_id, game_id, version=None):
+    if interaction.user.id != user_id:
+        await interaction.response.send_message("This isn't your game! Start your own with `$blackjack`", ephemeral=True)
+        return
+
+    # Buttons from a finished or replaced game point at a stale game id
+    state = state_for(interaction)
+    game = state.active_games.get(user_id)
+    if not game or game.game_id != game_id:
+        await interaction.response.send_message("No active game found!", ephemeral=True)
+        return
+
+    # A button drawn before the game's last move - usually the second half of a
+    # double click. The message is already being redrawn, so just ack it.
+    if version is not None and version < game.version:
+        await interaction.response.defer()
+        return
+
+    # A button from ahead of the game - it was restored from a snapshot older
+    # than the message after a restart. Redraw the game as it stands, with
+    # buttons that match it.
+    if version is not None and version > game.version:
+        await show_game(interaction, game)
+        return
+
+    # After a split, moves act on the active hand
+    if action not in game.moves():
+        await interaction.response.send_message("You can't do that right now!", ephemeral=True)
+        return
+
+    # Claim the move before play_move awaits anything, so a click on the same
+    # buttons that lands meanwhile is already stale. play_move returns False
+    # when it turned the action down without touching the game, which hands
+    # the buttons back to the player.
+    state.actions += 1
+    game.version += 1
+    game.actions += ACTION_CODES[action]
+    emit("action", user_id=user_id, game_id=game_id, action=action, version=game.version)
+    if await play_move(interaction, game, action) is False:
+        game.version -= 1
+        game.actions = game.actions[:-1]
+        emit("action_rejected", user_id=user_id, game_id=game_id, action=action)
+
+# Settle a finished game and log it to the hand history in one trip off the
+# event loop. Callers drop the game first, so nothing else can settle it while
+# this waits.
+async def settle_and_log(game, hands, guild_id):
+    def settle():
+        settlement = settle_game(game.user_id, hands, guild_id)
+        hand_history.record_games([(settlement, game.hands(), game.dealer_hand, game.actions, game.seed)])
+        return settlement
+    return await asyncio.to_thread(settle)
+
+# Settle a finished game from its hands as returned by game.play, clear it and
+# show the end game message
+async def finish_game(interaction, game, hands):
+    state = state_for(interaction)
+    drop_game(state, game.user_id)
+    settlement = await settle_and_log(game, hands, interaction.guild_id)
+    state.hands_settled += len(hands)
+
+    if game.split:
+        await show_split_result(interaction, game, hands, settlement)
+        return
+
+    result = hands[0][1]
+    outcome = settlement.hands[0][1]
+
+    # Save game data before deleting
+    game_data = {
+        'player_hand': game.player_hand.copy(),
+        'dealer_hand': game.dealer_hand.copy()
+    }
+
+    # Rematch with the bet from before any double down
+    original_bet = game.bet_amount // 2 if game.doubled_down else game.bet_amount
+
+    if outcome in ("win", "blackjack"):
+        await end_blackjack_game(interaction, interaction.user, None, "win", game.bet_amount, game_data, original_bet)
+    elif result == "forfeit":
+        await end_blackjack_game(interaction, None, interaction.user, "forfeit", game.bet_amount, game_data, original_bet)
+    elif outcome == "lose":
+        await end_blackjack_game(interaction, None, interaction.user, "lose", game.bet_amount, game_data, original_bet)
+    else:  # push
+        await end_blackjack_game(interaction, interaction.user, interaction.user, "tie", game.bet_amount, game_data, original_bet)
+
+# Settle a game the player walked away from as a forfeit of every hand, logged
+# like any finished game so the audit ledger still adds up
+async def forfeit_game(state, game, guild_id):
+    game.version += 1
+    game.actions += ACTION_CODES["forfeit"]
+    hands = game.play("forfeit")
+    emit("action", user_id=game.user_id, game_id=game.game_id, action="forfeit", version=game.version)
+    drop_game(state, game.user_id)
+    await settle_and_log(game, hands, guild_id)
+    state.hands_settled += len(hands)
+
+# Messages for a double or split the player can't cover
+NOT_ENOUGH_CHIPS = {
+    "double": "Not enough chips to double down!",
+    "split": "Not enough chips to split! You need to match the hand's bet.",
+}
+
+# Play one move the game offers. Doubling and splitting first put up a second
+# bet the size of the hand's. A bust on a split hand moves on to the next hand
+# without a popup.
+async def play_move(interaction, game, action):
+    if action in NOT_ENOUGH_CHIPS:
+        success, chips = debit_chips(interaction.user.id, game.active_bet(), interaction.guild_id)
+        if not success:
+            await interaction.response.send_message(NOT_ENOUGH_CHIPS[action], ephemeral=True)
+            return False
+
+    hands = game.play(action)
+    if hands:
+        await finish_game(interaction, game, hands)
+    else:
+        await show_game(interaction, game)
+
+# Show every split hand with its result once the dealer has played
+async def show_split_result(interaction, game, hands, settlement):
+    embed = render_split_result(SplitResultView(
+        interaction.user.display_name,
+        tuple(hand_of(hand) for hand in game.split["hands"]),
+        tuple(result for bet, result in hands),
+        hand_of(game.dealer_hand),
+        settlement.net,
+        settlement.wins,
+        settlement.losses
+    ))
+
+    # Add rematch button
+    view = RematchView(game.bet_amount, game.user_id)
+    image = await table_image(game.hands(), game.dealer_hand, False)
+
+    await edit_queue.submit(interaction, embed=embed, view=view, **image)
+
+# Rematch button
+class RematchButton(GuardedItem, discord.ui.DynamicItem[Button], template=r'bj:rematch:(?P<user_id>[0-9]+):(?P<amount>[0-9]+)'):
+    def __init__(self, bet_amount, user_id):
+        super().__init__(Button(label="Rematch", style=discord.ButtonStyle.success, emoji="🔄", custom_id=f"bj:rematch:{user_id}:{bet_amount}"))
+        self.bet_amount = bet_amount
+        self.user_id = user_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match['amount']), int(match['user_id']))
+
+    async def callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("This isn't your game! Start your own with `$blackjack`", ephemeral=True)
+            return
+        await start_game(interaction, self.bet_amount)
+
+class RematchView(discord.ui.View):
+    def __init__(self, bet_amount, original_user_id):
+        super().__init__(timeout=None)
+        self.add_item(RematchButton(bet_amount, original_user_id))
+
+# Commands
+# The game and stats commands are hybrid: they answer to both $prefix and
+# /slash. Each one defers first so slash commands never miss the 3 second
+# interaction deadline, and file access runs off the event loop.
+@commands.hybrid_command(description="Start a blackjack game")
+@app_commands.describe(mode="Type 'table' to open a shared table for up to 7 players")
+async def blackjack(ctx, mode: str = None):
+    await ctx.defer()
+
+    # A shutdown is saving the game in flight to restore it - don't forfeit it
+    # or take a new bet
+    if ctx.bot.draining:
+        await ctx.send(RESTART_MESSAGE)
+        return
+
+    # $blackjack table opens a shared table in this channel
+    if mode == "table":
+        tables = ctx.bot.extensions.get("cogs.tables")
+        if tables is None:
+            await ctx.send("Shared tables aren't available right now!")
+            return
+        await tables.open_table(ctx)
+        return
+
+    user_id = str(ctx.author.id)
+    state = state_for(ctx)
+
+    # Check if user already has an active game and forfeit it
+    game = state.active_games.get(ctx.author.id)
+    if game:
+        await forfeit_game(state, game, guild_id_for(ctx))
+        await ctx.send("🔄 Forfeited your previous game and starting a new one!")
+
+    # Load player data
+    player = await asyncio.to_thread(get_player, user_id, guild_id_for(ctx))
+    user_chips = player["chips"]
+
+    # Check if player has enough chips for minimum bet
+    if user_chips < 25:
+        await ctx.send(f"You need at least 25 chips to play! You have {user_chips} chips. Use `$daily` to get more chips.")
+        return
+
+    # Show bet selection menu
+    embed = discord.Embed(
+        title="🎰 Place Your Bet",
+        description=f"💰 You have **{user_chips}** chips\n\nChoose your bet amount:",
+        color=discord.Color.blue()
+    )
+
+    view = BetSelectionView(user_chips)
+    await ctx.send(embed=embed, view=view)
+
+@commands.command(name='bjhelp')
+async def bjhelp(ctx):
+    embed = discord.Embed(
+        title="🃏 Blackjack Bot Help",
+        description="Welcome to the Blackjack Bot! Here's everything you need to know:",
+        color=0x5865F2
+    )
+
+    embed.add_field(
+        name="🎯 How to Play",
+        value="• Get as close to 21 as possible without going over\n• Face cards (J, Q, K) are worth 10 points\n• Aces are worth 11 or 1 (automatically adjusted)\n• Beat the dealer's hand to win!",
+        inline=False
+    )
+
+    embed.add_field(
+        name="🎮 Game Controls",
+        value="• **Hit** - Draw another card\n• **Stand** - Keep your current hand\n• **Forfeit** - Give up and lose the game\n• **Double Down** - Double your bet for one more card\n• **Split** - Split a pair into two hands with a bet each, then play them one by one",
+        inline=False
+    )
+
+    embed.add_field(
+        name="📋 Commands",
+        value="• `$blackjack` - Start a new blackjack game with bet selection\n• `$blackjack table` - Open a shared table for up to 7 players\n• `$bjstats` - View your personal statistics\n• `$bjstats @user` - View another player's statistics\n• `$chips` - Check your current chip balance\n• `$daily` - Claim your daily 200 chip bonus\n• `$bjleaderboard [daily|weekly|all-time] [wins|net|winrate] [global|server]` - View the top players\n• `$bjhistory` - Page through your past hands\n• `$bjhelp` - Show this help message\n• `blackjack`, `chips`, `daily`, `bjstats`, `bjhistory` and `bjleaderboard` also work as `/` slash commands",
+        inline=False
+    )
+
+    embed.add_field(
+        name="💰 Betting System",
+        value="• Choose from 25, 50, or 100 chip bets\n• Blackjack pays 2.5x your bet\n• Regular wins pay 2x your bet\n• Ties return your bet",
+        inline=False
+    )
+
+    embed.add_field(
+        name="🏆 Winning Conditions",
+        value="• **Blackjack**: Get 21 with your first two cards (2.5x payout)\n• **Beat Dealer**: Get closer to 21 than the dealer\n• **Dealer Busts**: Dealer goes over 21\n• **Bust**: Going over 21 = automatic loss",
+        inline=False
+    )
+
+    embed.set_footer(text="Good luck at the tables! 🍀")
+
+    await ctx.send(embed=embed)
+
+# Sassy message lists - 60 total lines!
+bot_win_lines = [
+    "Better luck next time, sweetie. The house always wins 💅",
+    "That hand? Trash. But thanks for the donation.",
+    "Did you even *try*?",
+    "You fold like my grandma's laundry.",
+    "Call 911 — you just got robbed.",
+    "You lost to a bot. A **bot**. Embarrassing.",
+    "You played yourself.",
+    "I didn't even break a sweat.",
+    "Scoreboard says you owe me sympathy.",
+    "Tough game? No, *you're* just bad.",
+    "Next time bring something better than your luck… oh wait.",
+    "Ouch… that had to hurt.",
+    "I'd say it was close, but I'd be lying.",
+    "Please don't cry. I only deal cards.",
+    "Is that your best? Bless your heart.",
+    "You nearly had me… at like 5% effort.",
+    "Cue the sad violin.",
+    "Thanks for playing my charity round.",
+    "Do you need tissues or extra consolation?",
+    "Check under your seat — that's where your dignity is."
+]
+
+player_win_lines = [
+    "Wait—no! That's cheating. Run it back!",
+    "Ugh. I'm calling my supervisor.",
+    "Fine. Take your little win.",
+    "Beginner's luck. Don't get cocky.",
+    "Okay… who unplugged my RNG?",
+    "Whatever. I totally let you win.",
+    "This will not be forgotten.",
+    "You must be feeling real proud.",
+    "Destroying code feels… weird.",
+    "I guess even bots get burned sometimes.",
+    "Happy? Go buy yourself a trophy.",
+    "One round in your favor — I'll remember this.",
+    "Well aren't you the prodigy?",
+    "Not fair! You had skill.",
+    "I'll get you next time… I swear.",
+    "Congrats, you beat a dealer with no feelings.",
+    "Take a victory lap, champ.",
+    "My circuits need a minute after that one.",
+    "Be proud: you outplayed artificial intelligence.",
+    "That's what you get for underestimating me."
+]
+
+tie_lines = [
+    "A tie? Lame. I wanted carnage.",
+    "Well this was anti‑climactic.",
+    "I didn't lose — and that's what matters.",
+    "You got lucky I didn't finish the job.",
+    "Next round, *you're* going down.",
+    "Hold my cards — I'm not impressed.",
+    "Equal? Hardly satisfying.",
+    "It's a tie… which is just sad.",
+    "Let's call it a truce… for now.",
+    "Someone's stalling. Next.",
+    "Awkward. We both tried kinda hard.",
+    "Well, that went nowhere.",
+    "Half a win is still half.",
+    "Stalemate. How boring.",
+    "A draw… yawns the dealer.",
+    "Nobody wins here. Move along.",
+    "Equal parts wasted effort.",
+    "Meh. Let's not do that again.",
+    "States like this irritate me.",
+    "Tie game. Groan-worthy."
+]
+
+
+async def end_blackjack_game(interaction, winner, loser, result, bet_amount, game_data, original_bet):
+    # Pick the sassy line first - it is part of what gets rendered
+    if result == "win":
+        sassy_line = random.choice(player_win_lines)
+    elif result in ["lose", "forfeit"]:
+        sassy_line = random.choice(bot_win_lines)
+    else:  # tie
+        sassy_line = random.choice(tie_lines)
+
+    embed = render_result(ResultView(
+        interaction.user.display_name,
+        (winner or loser).mention,
+        hand_of(game_data['player_hand']),
+        hand_of(game_data['dealer_hand']),
+        result,
+        bet_amount,
+        sassy_line
+    ))
+
+    # Create rematch view with proper user validation and timeout handling
+    view = RematchView(original_bet, interaction.user.id)
+    image = await table_image([game_data['player_hand']], game_data['dealer_hand'], False)
+
+    await edit_queue.submit(interaction, embed=embed, view=view, **image)
+
+GAME_ITEMS = (BetButton, GameButton, RematchButton)
+
+async def setup(bot):
+    # Game buttons carry their routing data in the custom_id, so registering
+    # the item classes once is enough to serve every message, even after a restart
+    bot.add_dynamic_items(*GAME_ITEMS)
+    bot.add_command(blackjack)
+    bot.add_command(bjhelp)
+    if CARD_IMAGES:
+        await asyncio.to_thread(sprites)
+
+async def teardown(bot):
+    bot.remove_dynamic_items(*GAME_ITEMS)
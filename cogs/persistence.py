@@ -0,0 +1,44 @@
+import asyncio
+import os
+
+from discord.ext import tasks
+
+from backup import BACKUP_INTERVAL, backup_stores
+from gamestate import GAME_LOCK_TTL, SNAPSHOT_INTERVAL, flush_snapshots, game_lock, shard_states
+from storage import STORE_FLUSH_INTERVAL, flush_stores, store
+
+# Background loops: game snapshots and lock renewal, store flushes and backups.
+# Unloading this extension stops them; reloading starts them again.
+
+# Snapshot every shard's games and renew their game locks
+@tasks.loop(seconds=SNAPSHOT_INTERVAL)
+async def snapshot_games():
+    for state in list(shard_states.values()):
+        await flush_snapshots(state)
+        locks = [game_lock(user_id) for user_id in state.active_games]
+        await asyncio.to_thread(store.renew_locks, locks, state.lock_owner, GAME_LOCK_TTL)
+
+# Write out balance changes buffered by the JSON store
+@tasks.loop(seconds=STORE_FLUSH_INTERVAL)
+async def flush_store_changes():
+    await asyncio.to_thread(flush_stores)
+
+# Compressed, rotated backups of every balance store. Only the snapshot holds
+# the store, and only for a copy - compressing and writing run in a worker
+# thread while games carry on.
+@tasks.loop(seconds=BACKUP_INTERVAL)
+async def backup_balances():
+    await asyncio.to_thread(backup_stores, f"process:{os.getpid()}")
+
+LOOPS = (snapshot_games, flush_store_changes, backup_balances)
+
+async def setup(bot):
+    snapshot_games.start()
+    if STORE_FLUSH_INTERVAL > 0:
+        flush_store_changes.start()
+    if BACKUP_INTERVAL > 0:
+        backup_balances.start()
+
+async def teardown(bot):
+    for loop in LOOPS:
+        loop.cancel()
@@ -0,0 +1,343 @@
+import asyncio
+import time
+from typing import Literal
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+from discord.ui import Button, View
+
+from engine import ACTION_CODES, calculate_score, cards_from_bytes
+from gamestate import GuardedItem, edit_queue, guild_id_for, hand_history
+from leaderboards import MIN_GAMES, leaderboards
+from storage import get_player, get_stats
+
+# Player stats, hand history and the leaderboards: $bjstats, $bjhistory and
+# $bjleaderboard with their paging buttons. The leaderboard page cache starts
+# empty again when this extension is reloaded.
+
+@commands.hybrid_command(description="View blackjack statistics")
+@app_commands.describe(user="Player to look up (defaults to you)")
+async def bjstats(ctx, user: discord.Member = None):
+    await ctx.defer()
+
+    if user is None:
+        user = ctx.author
+
+    stats = await asyncio.to_thread(get_stats, user.id, guild_id_for(ctx))
+
+    if stats is None:
+        await ctx.send(f"{user.display_name} hasn't played any blackjack games yet!")
+        return
+
+    wins = stats["wins"]
+    losses = stats["losses"]
+    total_games = wins + losses
+    win_rate = (wins / total_games * 100) if total_games > 0 else 0
+
+    # Get chips from player data
+    player = await asyncio.to_thread(get_player, user.id, guild_id_for(ctx))
+    chips = player["chips"]
+
+    embed = discord.Embed(
+        title=f"🃏 {user.display_name}'s Blackjack Stats",
+        color=discord.Color.blue()
+    )
+
+    # Display user's profile picture
+    embed.set_thumbnail(url=user.display_avatar.url)
+
+    embed.add_field(name="🏆 Wins", value=str(wins), inline=True)
+    embed.add_field(name="💔 Losses", value=str(losses), inline=True)
+    embed.add_field(name="🎮 Total Games", value=str(total_games), inline=True)
+    embed.add_field(name="📊 Win Rate", value=f"{win_rate:.1f}%", inline=True)
+    embed.add_field(name="💰 Chips", value=str(chips), inline=True)
+
+    await ctx.send(embed=embed)
+
+@commands.hybrid_command(description="Page through past blackjack hands")
+@app_commands.describe(user="Player to look up (defaults to you)")
+async def bjhistory(ctx, user: discord.Member = None):
+    await ctx.defer()
+
+    if user is None:
+        user = ctx.author
+
+    embed, view = await history_page(user.id)
+    await ctx.send(embed=embed, view=view)
+
+HISTORY_PAGE_SIZE = 10
+
+# Move names for the ACTION_CODES letters in the history log
+ACTION_NAMES = {code: action.capitalize() for action, code in ACTION_CODES.items()}
+
+# One page of a player's hands, and whether there are newer and older ones
+def load_history_page(user_id, before, after):
+    hands = hand_history.page(user_id, HISTORY_PAGE_SIZE, before=before, after=after)
+    if not hands:
+        return hands, False, False
+    return hands, hand_history.has_newer(user_id, hands[0]["id"]), hand_history.has_older(user_id, hands[-1]["id"])
+
+# Load one page of a player's history in a worker thread, then build its embed
+# and paging buttons on the event loop - a View needs the running loop
+async def history_page(user_id, before=None, after=None):
+    hands, has_newer, has_older = await asyncio.to_thread(load_history_page, user_id, before, after)
+
+    embed = discord.Embed(
+        title="📜 Blackjack Hand History",
+        description=f"<@{user_id}>'s hands, newest first",
+        color=discord.Color.blue()
+    )
+
+    if not hands:
+        embed.description = f"<@{user_id}> has no recorded hands yet!"
+        return embed, None
+
+    for hand in hands:
+        player_hand = cards_from_bytes(hand["player_cards"])
+        dealer_hand = cards_from_bytes(hand["dealer_cards"])
+        actions = ", ".join(ACTION_NAMES[code] for code in hand["actions"]) or "None"
+        net = f"+{hand['net']}" if hand["net"] > 0 else str(hand["net"])
+        embed.add_field(
+            name=f"#{hand['id']} - {hand['result'].replace('_', ' ').title()}",
+            value=f"{''.join(player_hand)} ({calculate_score(player_hand)}) vs {''.join(dealer_hand)} ({calculate_score(dealer_hand)})\n"
+                  f"Bet: {hand['bet']} | Moves: {actions} | **{net} chips** | <t:{int(hand['played_at'])}:R>",
+            inline=False
+        )
+
+    newest, oldest = hands[0]["id"], hands[-1]["id"]
+    view = View(timeout=None)
+    view.add_item(HistoryButton(user_id, "newer", newest, disabled=not has_newer))
+    view.add_item(HistoryButton(user_id, "older", oldest, disabled=not has_older))
+    return embed, view
+
+# History paging buttons - the custom_id carries whose history it is and the
+# hand id to page from
+class HistoryButton(GuardedItem, discord.ui.DynamicItem[Button], template=r'bjh:(?P<user_id>[0-9]+):(?P<direction>newer|older):(?P<cursor>[0-9]+)'):
+    def __init__(self, user_id, direction, cursor, disabled=False):
+        label = "◀ Newer" if direction == "newer" else "Older ▶"
+        super().__init__(Button(label=label, style=discord.ButtonStyle.secondary, disabled=disabled, custom_id=f"bjh:{user_id}:{direction}:{cursor}"))
+        self.user_id = user_id
+        self.direction = direction
+        self.cursor = cursor
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match['user_id']), match['direction'], int(match['cursor']))
+
+    async def callback(self, interaction: discord.Interaction):
+        if self.direction == "newer":
+            embed, view = await history_page(self.user_id, after=self.cursor)
+        else:
+            embed, view = await history_page(self.user_id, before=self.cursor)
+        await edit_queue.submit(interaction, embed=embed, view=view)
+
+# Leaderboard wording for each board and metric
+LEADERBOARD_PERIODS = {"daily": "today", "weekly": "this week", "all-time": "of all time"}
+LEADERBOARD_METRICS = {"wins": "wins", "net": "net chips", "winrate": f"win rate (min. {MIN_GAMES} hands)"}
+LEADERBOARD_PAGE_SIZE = 10
+
+# Rendered leaderboard pages by (board, metric, guild_id, start, direction,
+# cursor), so flipping pages is a dict lookup and one edit. Every settled hand
+# changes some board, so pages aren't redrawn per hand - they expire after the
+# TTL, and a guild's pages as soon as players are found to have left it.
+LEADERBOARD_CACHE_TTL = 60
+LEADERBOARD_CACHE_SIZE = 256
+leaderboard_cache = {}  # key -> (rendered at, embed, paging buttons)
+
+# Guild membership and usernames fetched from the API, shared by every page so
+# a redraw doesn't look the same players up again. The bot has no members
+# intent, so the member cache rarely answers for a guild.
+LOOKUP_CACHE_TTL = 600
+LOOKUP_CACHE_SIZE = 4096
+lookup_cache = {}  # key -> (looked up at, result)
+
+async def cached_lookup(key, lookup):
+    cached = lookup_cache.get(key)
+    if cached and time.monotonic() - cached[0] < LOOKUP_CACHE_TTL:
+        return cached[1]
+    result = await lookup()
+    lookup_cache.pop(key, None)
+    lookup_cache[key] = (time.monotonic(), result)
+    if len(lookup_cache) > LOOKUP_CACHE_SIZE:
+        del lookup_cache[next(iter(lookup_cache))]
+    return result
+
+# Whether a player is still in a guild - the member cache first, then the API.
+# On a lookup error they are kept, as a later render can check again.
+async def in_guild(guild, user_id):
+    if guild.get_member(user_id) is not None:
+        return True
+
+    async def fetch():
+        try:
+            await guild.fetch_member(user_id)
+        except discord.NotFound:
+            return False
+        except discord.HTTPException:
+            pass
+        return True
+    return await cached_lookup(("member", guild.id, user_id), fetch)
+
+async def username(client, user_id):
+    user = client.get_user(user_id)
+    if user is not None:
+        return user.name
+
+    async def fetch():
+        try:
+            return (await client.fetch_user(user_id)).name
+        except discord.HTTPException:
+            return "Unknown User"
+    return await cached_lookup(("user", user_id), fetch)
+
+# One page of a board plus the row past it in the paging direction, if any.
+# Server boards drop players who have left the guild as they come up - the
+# leave event needs the members intent, which the bot doesn't ask for.
+async def load_leaderboard(client, board, metric, guild_id, before, after):
+    guild = client.get_guild(guild_id) if guild_id else None
+    while True:
+        rows = await asyncio.to_thread(leaderboards.page, board, metric, LEADERBOARD_PAGE_SIZE + 1, before, after, guild_id)
+        if guild is None:
+            return rows
+        gone = [row[0] for row in rows if not await in_guild(guild, row[0])]
+        if not gone:
+            return rows
+        await asyncio.to_thread(leaderboards.remove_members, guild_id, gone)
+        for key in [key for key in leaderboard_cache if key[2] == guild_id]:
+            del leaderboard_cache[key]
+
+# A row's place to page from, as leaderboards.page takes it
+def cursor_of(row):
+    user_id, wins, losses, games, net = row
+    return (wins, games, net, user_id)
+
+# Draw the page of a board starting at rank `start` (0 for the top), read
+# after or before a cursor row. Returns the embed and the paging buttons as
+# LeaderboardButton arguments.
+async def render_leaderboard(client, board, metric, guild_id, start, before, after):
+    leaderboard = await load_leaderboard(client, board, metric, guild_id, before, after)
+    more = len(leaderboard) > LEADERBOARD_PAGE_SIZE
+    if before:
+        leaderboard = leaderboard[-LEADERBOARD_PAGE_SIZE:]
+        has_prev, has_next = more, True
+        if not more:
+            start = 0
+    else:
+        leaderboard = leaderboard[:LEADERBOARD_PAGE_SIZE]
+        has_prev, has_next = after is not None, more
+
+    guild = client.get_guild(guild_id) if guild_id else None
+    embed = discord.Embed(
+        title=f"🏆 {guild.name} Leaderboard" if guild else "🏆 Blackjack Leaderboard",
+        description=f"Top players {LEADERBOARD_PERIODS[board]} by {LEADERBOARD_METRICS[metric]}:",
+        color=0xFFD700
+    )
+
+    if not leaderboard:
+        if metric == "winrate":
+            embed.description = f"Nobody has played {MIN_GAMES} hands {LEADERBOARD_PERIODS[board]} yet!"
+        else:
+            embed.description = f"No blackjack games have been played {LEADERBOARD_PERIODS[board]} yet!"
+        return embed, []
+
+    # Only look up names for the players on this page
+    leaderboard_text = ""
+    for i, (user_id, wins, losses, games, net) in enumerate(leaderboard):
+        name = await username(client, user_id)
+        rank = f"#{start + i + 1}"
+        if metric == "net":
+            score = f"Net: {'+' if net > 0 else ''}{net} | "
+        elif metric == "winrate":
+            score = f"Win rate: {wins / games * 100:.1f}% | "
+        else:
+            score = ""
+        leaderboard_text += f"**{rank} {name}** - {score}W: {wins} | L: {losses}\n"
+
+    embed.add_field(name="", value=leaderboard_text, inline=False)
+    embed.set_footer(text=f"Ranks {start + 1}-{start + len(leaderboard)}")
+
+    if not has_prev and not has_next:
+        return embed, []
+    return embed, [
+        (board, metric, guild_id, max(start - LEADERBOARD_PAGE_SIZE, 0), "before", cursor_of(leaderboard[0]), "◀ Prev", not has_prev),
+        (board, metric, guild_id, start + len(leaderboard), "after", cursor_of(leaderboard[-1]), "Next ▶", not has_next),
+    ]
+
+async def leaderboard_page(client, board, metric, guild_id, start=0, direction=None, cursor=None):
+    key = (board, metric, guild_id, start, direction, cursor)
+    cached = leaderboard_cache.get(key)
+    if cached and time.monotonic() - cached[0] < LEADERBOARD_CACHE_TTL:
+        rendered_at, embed, buttons = cached
+    else:
+        before = cursor if direction == "before" else None
+        after = cursor if direction == "after" else None
+        embed, buttons = await render_leaderboard(client, board, metric, guild_id, start, before, after)
+        leaderboard_cache.pop(key, None)
+        leaderboard_cache[key] = (time.monotonic(), embed, buttons)
+        if len(leaderboard_cache) > LEADERBOARD_CACHE_SIZE:
+            del leaderboard_cache[next(iter(leaderboard_cache))]
+
+    view = None
+    if buttons:
+        view = View(timeout=None)
+        for button in buttons:
+            view.add_item(LeaderboardButton(*button))
+    return embed, view
+
+# Leaderboard page buttons - the custom_id carries the board, metric, guild
+# (0 for the global board), the rank the page starts at and the row to page
+# after (a) or before (b) as wins.games.net.user_id, kept short for the 100
+# character custom_id limit. Buttons drawn with page numbers, before cursors,
+# have neither and show the top of the board.
+class LeaderboardButton(GuardedItem, discord.ui.DynamicItem[Button], template=r'bjlb:(?P<board>daily|weekly|all-time):(?P<metric>wins|net|winrate):(?P<guild_id>[0-9]+):(?P<start>[0-9]+)(?::(?P<direction>[ab]):(?P<cursor>-?[0-9]+(?:\.-?[0-9]+){3}))?'):
+    def __init__(self, board, metric, guild_id, start=0, direction=None, cursor=None, label="Page", disabled=False):
+        custom_id = f"bjlb:{board}:{metric}:{guild_id}:{start}"
+        if direction:
+            custom_id += f":{direction[0]}:{'.'.join(str(value) for value in cursor)}"
+        super().__init__(Button(label=label, style=discord.ButtonStyle.secondary, disabled=disabled, custom_id=custom_id))
+        self.board = board
+        self.metric = metric
+        self.guild_id = guild_id
+        self.start = start
+        self.direction = direction
+        self.cursor = cursor
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        if not match['direction']:
+            return cls(match['board'], match['metric'], int(match['guild_id']))
+        cursor = tuple(int(value) for value in match['cursor'].split('.'))
+        direction = "after" if match['direction'] == "a" else "before"
+        return cls(match['board'], match['metric'], int(match['guild_id']), int(match['start']), direction, cursor)
+
+    async def callback(self, interaction: discord.Interaction):
+        embed, view = await leaderboard_page(interaction.client, self.board, self.metric, self.guild_id, self.start, self.direction, self.cursor)
+        await edit_queue.submit(interaction, embed=embed, view=view)
+
+@commands.hybrid_command(description="View the top blackjack players")
+@app_commands.describe(
+    board="Time window to rank (defaults to all-time)",
+    metric="What to rank players by (defaults to wins)",
+    scope="Everyone, or only players in this server (defaults to everyone)"
+)
+async def bjleaderboard(ctx, board: Literal["daily", "weekly", "all-time"] = "all-time", metric: Literal["wins", "net", "winrate"] = "wins", scope: Literal["global", "server"] = "global"):
+    await ctx.defer()
+
+    guild_id = ctx.guild.id if scope == "server" and ctx.guild else 0
+    embed, view = await leaderboard_page(ctx.bot, board, metric, guild_id)
+    await ctx.send(embed=embed, view=view)
+
+# Take leavers off the server leaderboard (only fires with the members intent)
+async def on_member_remove(member):
+    await asyncio.to_thread(leaderboards.remove_member, member.guild.id, member.id)
+
+async def setup(bot):
+    bot.add_dynamic_items(HistoryButton, LeaderboardButton)
+    bot.add_command(bjstats)
+    bot.add_command(bjhistory)
+    bot.add_command(bjleaderboard)
+    bot.add_listener(on_member_remove)
+
+async def teardown(bot):
+    bot.remove_dynamic_items(HistoryButton, LeaderboardButton)
@@ -0,0 +1,389 @@
+import asyncio
+import time
+
+import discord
+from discord.ui import Button
+
+from engine import ACTION_CODES, Shoe, calculate_score, get_hand_result
+from gamestate import BET_AMOUNTS, GAME_BUTTONS, RESTART_MESSAGE, GuardedItem, guild_id_for, hand_history, in_flight, state_for
+from settlement import Settlement, settle_games
+from storage import debit_chips
+
+# Up to 7 players share one shoe, one dealer hand and one table message. Actions
+# are collected during a timed round, the dealer plays once, every seat settles
+# in a single batch and the whole table is redrawn with one embed edit.
+MAX_SEATS = 7
+JOIN_WINDOW = 20  # seconds to take a seat before the deal
+ACTION_WINDOW = 30  # seconds to act before remaining seats auto-stand
+
+class TableSeat:
+    def __init__(self, user, bet_amount):
+        self.user_id = user.id
+        self.name = user.display_name
+        self.bet_amount = bet_amount
+        self.hand = []
+        self.doubled_down = False
+        self.done = False
+        self.result = None
+        self.actions = ""
+
+        # Bumped on every move, so buttons drawn before the move are stale
+        self.version = 0
+
+class BlackjackTable:
+    def __init__(self, channel_id, guild_id=None):
+        self.table_id = int(time.time() * 1000)
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.shoe = Shoe()
+        self.seats = {}
+        self.dealer_hand = []
+        self.phase = "betting"
+        self.message = None
+        self.task = None
+        self.seats_full = asyncio.Event()
+        self.all_done = asyncio.Event()
+
+    def deal(self):
+        if self.shoe.needs_shuffle():
+            self.shoe.shuffle()
+
+        self.dealer_hand = []
+        for seat in self.seats.values():
+            seat.hand = [self.shoe.draw()]
+        self.dealer_hand.append(self.shoe.draw())
+        for seat in self.seats.values():
+            seat.hand.append(self.shoe.draw())
+            # Naturals have nothing left to decide
+            seat.done = calculate_score(seat.hand) == 21
+        self.dealer_hand.append(self.shoe.draw())
+        self.phase = "playing"
+        self.check_done()
+
+    def hit(self, seat):
+        seat.hand.append(self.shoe.draw())
+        if calculate_score(seat.hand) >= 21:
+            seat.done = True
+        self.check_done()
+
+    def stand(self, seat):
+        seat.done = True
+        self.check_done()
+
+    def double_down(self, seat):
+        seat.doubled_down = True
+        seat.bet_amount *= 2
+        seat.hand.append(self.shoe.draw())
+        seat.done = True
+        self.check_done()
+
+    def check_done(self):
+        if all(seat.done for seat in self.seats.values()):
+            self.all_done.set()
+
+    # Dealer plays once for the whole table, then every seat settles in one
+    # batch off the event loop. The round is marked finished before that
+    # awaits, so a join meanwhile starts the next round on fresh seats.
+    async def finish_round(self):
+        for seat in self.seats.values():
+            seat.done = True
+
+        # Only draw for the dealer if someone is still in the hand
+        if any(calculate_score(seat.hand) <= 21 for seat in self.seats.values()):
+            while calculate_score(self.dealer_hand) < 17:
+                self.dealer_hand.append(self.shoe.draw())
+
+        settlements = []
+        for seat in self.seats.values():
+            seat.result = get_hand_result(seat.hand, self.dealer_hand)
+            settlements.append(Settlement(seat.user_id, [(seat.bet_amount, seat.result)], self.guild_id))
+        hands = [
+            (settlement, [seat.hand], self.dealer_hand, seat.actions, None)
+            for settlement, seat in zip(settlements, self.seats.values())
+        ]
+
+        # The next round waits on these again - a full table would otherwise
+        # find seats_full still set and close as soon as the results are up
+        self.phase = "finished"
+        self.seats_full.clear()
+        self.all_done.clear()
+
+        await asyncio.to_thread(record_round, settlements, hands)
+        return settlements
+
+    def new_round(self):
+        self.seats = {}
+        self.dealer_hand = []
+        self.phase = "betting"
+        self.seats_full.clear()
+        self.all_done.clear()
+
+def record_round(settlements, hands):
+    settle_games(settlements)
+    hand_history.record_games(hands)
+
+# Footer text for each seat result
+TABLE_RESULTS = {
+    "blackjack": "🃏 BLACKJACK",
+    "player_wins": "🎉 WIN",
+    "dealer_bust": "🎉 WIN",
+    "push": "🤝 PUSH",
+    "player_bust": "💥 BUST",
+    "dealer_wins": "😔 LOSE",
+    "dealer_blackjack": "😔 LOSE",
+}
+
+def create_table_embed(table):
+    embed = discord.Embed(title="🎰 Blackjack Table 🎰", color=discord.Color.dark_red())
+
+    if table.phase == "betting":
+        embed.description = f"Take a seat! Dealing in {JOIN_WINDOW} seconds ({len(table.seats)}/{MAX_SEATS} seats taken)"
+        return embed
+
+    # Dealer hand
+    if table.phase == "playing":
+        dealer_value = f"{table.dealer_hand[0]} ❓ ({calculate_score([table.dealer_hand[0]])} + ?)"
+    else:
+        dealer_value = f"{''.join(table.dealer_hand)} ({calculate_score(table.dealer_hand)})"
+    embed.add_field(name="🏛️ Dealer Hand", value=dealer_value, inline=False)
+
+    # One field per seat
+    for seat in table.seats.values():
+        score = calculate_score(seat.hand)
+        value = f"{''.join(seat.hand)} ({score}) - {seat.bet_amount} chips"
+        if seat.result:
+            value += f"\n**{TABLE_RESULTS[seat.result]}**"
+        elif seat.done:
+            value += "\n✋ Standing" if score <= 21 else "\n💥 BUST"
+        embed.add_field(name=f"👤 {seat.name}", value=value, inline=True)
+
+    if table.phase == "playing":
+        embed.set_footer(text=f"Hit, stand or double down - the dealer plays in {ACTION_WINDOW} seconds")
+    else:
+        embed.set_footer(text=f"Join now for the next round - dealing in {JOIN_WINDOW} seconds")
+    return embed
+
+# Table buttons - the custom_id carries the action, the table, and then the bet
+# for joins or the seat version a move was drawn at. Moves drawn before
+# versions were added have none and skip that check.
+class TableButton(GuardedItem, discord.ui.DynamicItem[Button], template=r'bjt:(?P<action>join|hit|stand|double):(?P<table_id>[0-9]+)(?::(?P<amount>[0-9]+))?'):
+    def __init__(self, action, table_id, bet_amount=None, version=None):
+        if action == "join":
+            label, style, emoji = f"Join {bet_amount}", discord.ButtonStyle.primary, "🪑"
+            custom_id = f"bjt:join:{table_id}:{bet_amount}"
+        else:
+            label, style, emoji = GAME_BUTTONS[action]
+            custom_id = f"bjt:{action}:{table_id}" if version is None else f"bjt:{action}:{table_id}:{version}"
+        super().__init__(Button(label=label, style=style, emoji=emoji, custom_id=custom_id))
+        self.action = action
+        self.table_id = table_id
+        self.bet_amount = bet_amount
+        self.version = version
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        number = int(match['amount']) if match['amount'] else None
+        if match['action'] == "join":
+            return cls("join", int(match['table_id']), number)
+        return cls(match['action'], int(match['table_id']), version=number)
+
+    async def callback(self, interaction: discord.Interaction):
+        await dispatch_table_action(interaction, self.action, self.table_id, self.bet_amount, self.version)
+
+class TableView(discord.ui.View):
+    def __init__(self, table):
+        super().__init__(timeout=None)
+
+        if table.phase in ("betting", "finished"):
+            for bet_amount in BET_AMOUNTS:
+                self.add_item(TableButton("join", table.table_id, bet_amount))
+        elif table.phase == "playing":
+            # Drawn at version 0, so they only take a seat's first move
+            for action in ("hit", "stand", "double"):
+                self.add_item(TableButton(action, table.table_id, version=0))
+
+# A seat's own buttons, sent with its hand after each move and drawn at the
+# seat's version
+class SeatView(discord.ui.View):
+    def __init__(self, table, seat):
+        super().__init__(timeout=None)
+        self.add_item(TableButton("hit", table.table_id, version=seat.version))
+        self.add_item(TableButton("stand", table.table_id, version=seat.version))
+        if len(seat.hand) == 2 and not seat.doubled_down:
+            self.add_item(TableButton("double", table.table_id, version=seat.version))
+
+@in_flight.track
+async def dispatch_table_action(interaction, action, table_id, bet_amount, version=None):
+    table = state_for(interaction).tables.get(interaction.channel_id)
+    if not table or table.table_id != table_id:
+        await interaction.response.send_message("This table has closed! Open a new one with `$blackjack table`", ephemeral=True)
+        return
+
+    if action == "join":
+        await join_table(interaction, table, bet_amount)
+        return
+
+    seat = table.seats.get(interaction.user.id)
+    if table.phase != "playing" or not seat:
+        await interaction.response.send_message("You're not playing this round!", ephemeral=True)
+        return
+    if seat.done:
+        await interaction.response.send_message("You've already finished your hand this round!", ephemeral=True)
+        return
+
+    # A button drawn before the seat's last move. Stale table message buttons
+    # get a pointer to the seat's own buttons; anything else is usually the
+    # second half of a double click, and is only acked.
+    if version is not None and version != seat.version:
+        if version == 0:
+            await interaction.response.send_message("Keep playing with the buttons under your hand!", ephemeral=True)
+        else:
+            await interaction.response.defer()
+        return
+
+    if action == "hit":
+        table.hit(seat)
+    elif action == "stand":
+        table.stand(seat)
+    elif action == "double":
+        if len(seat.hand) != 2 or seat.doubled_down:
+            await interaction.response.send_message("Cannot double down at this time!", ephemeral=True)
+            return
+        success, chips = debit_chips(seat.user_id, seat.bet_amount, table.guild_id)
+        if not success:
+            await interaction.response.send_message("Not enough chips to double down!", ephemeral=True)
+            return
+        table.double_down(seat)
+    seat.actions += ACTION_CODES[action]
+    seat.version += 1
+
+    # Only the acting player hears about their hand - the table message is
+    # redrawn once when the round resolves. A move made from the seat's own
+    # buttons redraws that message.
+    score = calculate_score(seat.hand)
+    status = " 💥 BUST!" if score > 21 else ""
+    content = f"Your hand: {''.join(seat.hand)} ({score}){status}"
+    view = None if seat.done else SeatView(table, seat)
+    if version:
+        await interaction.response.edit_message(content=content, view=view)
+    elif view:
+        await interaction.response.send_message(content, view=view, ephemeral=True)
+    else:
+        await interaction.response.send_message(content, ephemeral=True)
+
+async def join_table(interaction, table, bet_amount):
+    if table.phase == "playing":
+        await interaction.response.send_message("This round has already been dealt - wait for the next one!", ephemeral=True)
+        return
+    if interaction.user.id in table.seats:
+        await interaction.response.send_message("You already have a seat at this table!", ephemeral=True)
+        return
+    if bet_amount not in BET_AMOUNTS:
+        await interaction.response.send_message("That bet is no longer available!", ephemeral=True)
+        return
+    if len(table.seats) >= MAX_SEATS:
+        await interaction.response.send_message("This table is full!", ephemeral=True)
+        return
+
+    success, chips = debit_chips(interaction.user.id, bet_amount, table.guild_id)
+    if not success:
+        await interaction.response.send_message(f"You don't have enough chips! You have {chips} chips.", ephemeral=True)
+        return
+
+    # First seat taken after a round clears the finished hands
+    if table.phase == "finished":
+        table.new_round()
+
+    table.seats[interaction.user.id] = TableSeat(interaction.user, bet_amount)
+    if len(table.seats) >= MAX_SEATS:
+        table.seats_full.set()
+    await interaction.response.send_message(f"🪑 You joined the table with {bet_amount} chips!", ephemeral=True)
+
+# Wait for an event, giving up after the timeout
+async def wait_for_event(event, timeout):
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+# Drive a table round after round until nobody sits down
+async def run_table(state, table):
+    try:
+        while True:
+            await wait_for_event(table.seats_full, JOIN_WINDOW)
+            if table.phase != "betting" or not table.seats:
+                # Off the channel before the edit awaits, so a join that lands
+                # meanwhile finds the table closed instead of losing its bet
+                close_table(state, table)
+                await edit_table_message(table, content="🪑 The table closed - nobody sat down.", view=None)
+                break
+
+            table.deal()
+            await edit_table_message(table, embed=create_table_embed(table), view=TableView(table))
+
+            await wait_for_event(table.all_done, ACTION_WINDOW)
+            state.hands_settled += len(await table.finish_round())
+
+            # Results stay up with the join buttons for the next round
+            await edit_table_message(table, embed=create_table_embed(table), view=TableView(table))
+    finally:
+        close_table(state, table)
+        # Seats have paid their bets - a round cut short still settles
+        if table.phase == "betting" and table.seats:
+            table.deal()
+        if table.phase == "playing":
+            state.hands_settled += len(await table.finish_round())
+
+# A deleted table message or a Discord error doesn't stop the round - seats
+# that can't reach their buttons stand when the action window runs out
+async def edit_table_message(table, **kwargs):
+    try:
+        await table.message.edit(**kwargs)
+    except discord.HTTPException:
+        pass
+
+def close_table(state, table):
+    if state.tables.get(table.channel_id) is table:
+        del state.tables[table.channel_id]
+
+async def open_table(ctx):
+    if ctx.bot.draining:
+        await ctx.send(RESTART_MESSAGE)
+        return
+    state = state_for(ctx)
+    if ctx.channel.id in state.tables:
+        await ctx.send("A table is already open in this channel - grab a seat!")
+        return
+
+    table = BlackjackTable(ctx.channel.id, guild_id_for(ctx))
+    state.tables[ctx.channel.id] = table
+    # The table lives in a channel message: interaction followups can only be
+    # edited for 15 minutes, and a busy table can run far longer
+    table.message = await ctx.channel.send(embed=create_table_embed(table), view=TableView(table))
+    table.task = asyncio.create_task(run_table(state, table))
+
+    if ctx.interaction:
+        await ctx.send("🪑 Opened a blackjack table!")
+
+# Close every table for a shutdown. Tables aren't snapshotted, so their rounds
+# are played out: seats that haven't acted stand, as when the action window
+# runs out, and a round still taking seats is dealt and stood on
+async def close_tables(state):
+    for table in list(state.tables.values()):
+        close_table(state, table)
+        if table.task:
+            table.task.cancel()
+        if table.phase == "betting" and table.seats:
+            table.deal()
+        if table.phase == "playing":
+            state.hands_settled += len(await table.finish_round())
+        await edit_table_message(table, content="🔄 The table closed for a restart.", embed=create_table_embed(table), view=None)
+
+# Opened through $blackjack table (see cogs/games.py). A table's round loop
+# keeps running the code it started with until the table closes; new tables
+# and every button click use the reloaded code.
+async def setup(bot):
+    bot.add_dynamic_items(TableButton)
+
+async def teardown(bot):
+    bot.remove_dynamic_items(TableButton)
@@ -0,0 +1,76 @@
+import asyncio
+
+import discord
+
+from events import emit
+
+# Minimum seconds between edits of the same message
+EDIT_WINDOW = 1.0
+
+# Edit the message a component interaction came from with one API call
+async def respond_edit(interaction, **kwargs):
+    try:
+        if not interaction.response.is_done():
+            await interaction.response.edit_message(**kwargs)
+        else:
+            await interaction.edit_original_response(**kwargs)
+    except discord.HTTPException as e:
+        emit("edit_failed", message_id=interaction.message.id, status=e.status, code=e.code, error=e.text)
+
+# Per-message render queue. The first click in a window edits straight away;
+# clicks that land inside the window are acked with a deferred update and only
+# the newest pending state is drawn, in one edit once the window has passed.
+class MessageEditQueue:
+    def __init__(self, window=EDIT_WINDOW):
+        self.window = window
+        self.cooling = {}  # message_id -> loop time its current window ends
+        self.pending = {}  # message_id -> (interaction, edit kwargs)
+        self.tasks = set()
+
+    async def submit(self, interaction, **kwargs):
+        message_id = interaction.message.id
+
+        if message_id not in self.cooling and message_id not in self.pending:
+            self._start_window(message_id)
+            await respond_edit(interaction, **kwargs)
+            return
+
+        # Ack now, draw later - a newer state replaces any that is still waiting
+        if not interaction.response.is_done():
+            await interaction.response.defer()
+        if message_id not in self.pending:
+            task = asyncio.get_running_loop().create_task(self._flush_later(message_id))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        self.pending[message_id] = (interaction, kwargs)
+
+    def _start_window(self, message_id):
+        if self.window <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        window_end = loop.time() + self.window
+        self.cooling[message_id] = window_end
+        loop.call_later(self.window, self._end_window, message_id, window_end)
+
+    def _end_window(self, message_id, window_end):
+        # A later edit may have opened a newer window for the same message
+        if self.cooling.get(message_id) == window_end:
+            del self.cooling[message_id]
+
+    async def _flush_later(self, message_id):
+        window_end = self.cooling.get(message_id)
+        if window_end is not None:
+            await asyncio.sleep(max(0, window_end - asyncio.get_running_loop().time()))
+
+        entry = self.pending.pop(message_id, None)
+        if entry is None:
+            return
+        interaction, kwargs = entry
+        self._start_window(message_id)
+        await respond_edit(interaction, **kwargs)
+
+    # Send anything still waiting right away
+    async def flush(self):
+        while self.pending:
+            message_id, (interaction, kwargs) = self.pending.popitem()
+            await respond_edit(interaction, **kwargs)
@@ -0,0 +1,377 @@
+import os
+import random
+import time
+
+# Game rules with no Discord in them - the bot drives games through here, and
+# so does replay.py when it re-runs recorded games
+
+# Card deck
+def create_deck():
+    # Using actual card emojis
+    deck = [
+        # Spades (♠️)
+        '🂡', '🂢', '🂣', '🂤', '🂥', '🂦', '🂧', '🂨', '🂩', '🂪', '🂫', '🂭', '🂮',
+        # Hearts (♥️)
+        '🂱', '🂲', '🂳', '🂴', '🂵', '🂶', '🂷', '🂸', '🂹', '🂺', '🂻', '🂽', '🂾',
+        # Diamonds (♦️)
+        '🃁', '🃂', '🃃', '🃄', '🃅', '🃆', '🃇', '🃈', '🃉', '🃊', '🃋', '🃍', '🃎',
+        # Clubs (♣️)
+        '🃑', '🃒', '🃓', '🃔', '🃕', '🃖', '🃗', '🃘', '🃙', '🃚', '🃛', '🃝', '🃞'
+    ]
+    return deck
+
+# Compact card encoding - each card is stored as its index in the deck
+CARD_INDEX = {card: i for i, card in enumerate(create_deck())}
+CARD_FROM_INDEX = create_deck()
+
+def card_bytes(cards):
+    return bytes(CARD_INDEX[card] for card in cards)
+
+def cards_from_bytes(data):
+    return [CARD_FROM_INDEX[i] for i in data]
+
+def encode_cards(cards):
+    return bytes([len(cards)]) + card_bytes(cards)
+
+def decode_cards(data, offset):
+    count = data[offset]
+    cards = [CARD_FROM_INDEX[i] for i in data[offset + 1:offset + 1 + count]]
+    return cards, offset + 1 + count
+
+# Card emoji to value mapping
+CARD_VALUES = {
+    # Spades
+    '🂡': 1, '🂢': 2, '🂣': 3, '🂤': 4, '🂥': 5, '🂦': 6, '🂧': 7, '🂨': 8, '🂩': 9, '🂪': 10, '🂫': 10, '🂭': 10, '🂮': 10,
+    # Hearts
+    '🂱': 1, '🂲': 2, '🂳': 3, '🂴': 4, '🂵': 5, '🂶': 6, '🂷': 7, '🂸': 8, '🂹': 9, '🂺': 10, '🂻': 10, '🂽': 10, '🂾': 10,
+    # Diamonds
+    '🃁': 1, '🃂': 2, '🃃': 3, '🃄': 4, '🃅': 5, '🃆': 6, '🃇': 7, '🃈': 8, '🃉': 9, '🃊': 10, '🃋': 10, '🃍': 10, '🃎': 10,
+    # Clubs
+    '🃑': 1, '🃒': 2, '🃓': 3, '🃔': 4, '🃕': 5, '🃖': 6, '🃗': 7, '🃘': 8, '🃙': 9, '🃚': 10, '🃛': 10, '🃝': 10, '🃞': 10
+}
+
+# Calculate score
+def calculate_score(hand):
+    score = 0
+    aces = 0
+
+    for card in hand:
+        value = CARD_VALUES.get(card, 0)
+
+        if value == 1:  # Ace
+            aces += 1
+            score += 11
+        else:
+            score += value
+
+    # Adjust for aces
+    while score > 21 and aces > 0:
+        score -= 10
+        aces -= 1
+
+    return score
+
+# Split rules. A split hand that is a pair again can be re-split up to
+# SPLIT_MAX_HANDS hands, and doubled on its first two cards with
+# DOUBLE_AFTER_SPLIT. With SPLIT_ACES_ONE_CARD split aces take one card each and
+# stand, unless RESPLIT_ACES lets a hand that drew another ace split again.
+# Recorded games replay under the rules in force when replay.py runs, and
+# hands played with split aces before SPLIT_ACES_ONE_CARD was turned on won't
+# replay the same.
+SPLIT_MAX_HANDS = int(os.getenv('SPLIT_MAX_HANDS', '4'))
+DOUBLE_AFTER_SPLIT = os.getenv('DOUBLE_AFTER_SPLIT', '1') == '1'
+SPLIT_ACES_ONE_CARD = os.getenv('SPLIT_ACES_ONE_CARD', '0') == '1'
+RESPLIT_ACES = os.getenv('RESPLIT_ACES', '0') == '1'
+
+def is_pair(hand):
+    return len(hand) == 2 and CARD_VALUES.get(hand[0], 0) == CARD_VALUES.get(hand[1], 0)
+
+# One letter per move in the history log
+ACTION_CODES = {"hit": "H", "stand": "S", "double": "D", "split": "P", "forfeit": "F"}
+ACTIONS = {code: action for action, code in ACTION_CODES.items()}
+
+# Game class
+class BlackjackGame:
+    def __init__(self, user_id, bet_amount=50, seed=None):
+        self.user_id = user_id
+        self.game_id = int(time.time() * 1000)
+        self.bet_amount = bet_amount
+
+        # The seed alone decides the deck order, so a game can be replayed from
+        # its seed and its moves. SystemRandom picks it so it can't be guessed.
+        self.seed = random.SystemRandom().getrandbits(63) if seed is None else seed
+        self.deck = create_deck()
+        random.Random(self.seed).shuffle(self.deck)
+
+        self.player_hand = []
+        self.dealer_hand = []
+
+        # Deal initial cards
+        self.player_hand.append(self.deck.pop())
+        self.dealer_hand.append(self.deck.pop())
+        self.player_hand.append(self.deck.pop())
+        self.dealer_hand.append(self.deck.pop())
+
+        self.game_over = False
+        self.doubled_down = False
+
+        # After a split: {"hands": [cards, ...], "bets": [bet, ...], "active":
+        # index of the hand being played}. Hands before the active one are done.
+        self.split = None
+
+        # Bumped on every move, so snapshots only rewrite changed games and
+        # buttons drawn before the move are stale
+        self.version = 0
+
+        # One ACTION_CODES letter per move, kept for the hand history
+        self.actions = ""
+
+    @classmethod
+    def from_snapshot(cls, user_id, game_id, version, bet_amount, player_hand, dealer_hand, deck, game_over, doubled_down, actions="", split=None, seed=None):
+        game = cls.__new__(cls)
+        game.user_id = user_id
+        game.game_id = game_id
+        game.bet_amount = bet_amount
+        game.seed = seed
+        game.deck = deck
+        game.player_hand = player_hand
+        game.dealer_hand = dealer_hand
+        game.game_over = game_over
+        game.doubled_down = doubled_down
+        game.split = split
+        game.version = version
+        game.actions = actions
+        return game
+
+    # Doubling and splitting act on the active hand after a split
+    def can_double_down(self):
+        if self.split:
+            hand = self.active_split_hand()
+            return DOUBLE_AFTER_SPLIT and len(hand) == 2 and not self._split_ace(hand)
+        return len(self.player_hand) == 2 and not self.doubled_down
+
+    # Same rank cards, with room for another hand
+    def can_split(self):
+        if not self.split:
+            return SPLIT_MAX_HANDS >= 2 and is_pair(self.player_hand)
+        return self._can_resplit(self.active_split_hand())
+
+    # Moves open to the player as the game stands, in button order. Split
+    # hands can't be forfeited, and a split ace waiting to be re-split can
+    # only stand or split.
+    def moves(self):
+        if not self.split:
+            moves = ["hit", "stand", "forfeit"]
+        elif self._split_ace(self.active_split_hand()):
+            moves = ["stand"]
+        else:
+            moves = ["hit", "stand"]
+        if self.can_double_down():
+            moves.append("double")
+        if self.can_split():
+            moves.append("split")
+        return moves
+
+    # The bet a double or split has to match - the active hand's
+    def active_bet(self):
+        if self.split:
+            return self.split["bets"][self.split["active"]]
+        return self.bet_amount
+
+    def hit(self):
+        if not self.game_over:
+            self.player_hand.append(self.deck.pop())
+            if calculate_score(self.player_hand) > 21:
+                self.game_over = True
+                return "bust"
+        return "continue"
+
+    def double_down(self):
+        if self.can_double_down():
+            self.doubled_down = True
+            self.bet_amount *= 2
+            self.hit()
+            self.game_over = True
+            return True
+        return False
+
+    def dealer_play(self):
+        while calculate_score(self.dealer_hand) < 17:
+            self.dealer_hand.append(self.deck.pop())
+
+    def get_result(self):
+        return get_hand_result(self.player_hand, self.dealer_hand)
+
+    # Split the opening pair, or the active split hand, into two hands with
+    # the same bet, each dealt a second card. Returns True when no hand is left
+    # to play (split aces with SPLIT_ACES_ONE_CARD).
+    def start_split(self):
+        if self.split is None:
+            self.split = {"hands": [self.player_hand], "bets": [self.bet_amount], "active": 0}
+        split = self.split
+        active = split["active"]
+        first, second = split["hands"][active]
+        split["hands"][active:active + 1] = [[first, self.deck.pop()], [second, self.deck.pop()]]
+        split["bets"].insert(active, split["bets"][active])
+        return self._play_from(active)
+
+    def active_split_hand(self):
+        return self.split["hands"][self.split["active"]]
+
+    # A hand from a split of aces, under SPLIT_ACES_ONE_CARD
+    def _split_ace(self, hand):
+        return SPLIT_ACES_ONE_CARD and CARD_VALUES.get(hand[0], 0) == 1
+
+    def _can_resplit(self, hand):
+        if len(self.split["hands"]) >= SPLIT_MAX_HANDS or not is_pair(hand):
+            return False
+        return RESPLIT_ACES or CARD_VALUES.get(hand[0], 0) != 1
+
+    # Make the first hand from `index` on that takes a move the active one -
+    # split aces that can't be re-split are skipped. Returns True once every
+    # hand is done.
+    def _play_from(self, index):
+        hands = self.split["hands"]
+        while index < len(hands) and self._split_ace(hands[index]) and not self._can_resplit(hands[index]):
+            index += 1
+        self.split["active"] = index
+        return index >= len(hands)
+
+    # Move on to the next hand, returning True once every hand is done
+    def next_split_hand(self):
+        return self._play_from(self.split["active"] + 1)
+
+    # A bust ends the active hand - returns True once every hand is done
+    def split_hit(self):
+        hand = self.active_split_hand()
+        hand.append(self.deck.pop())
+        if calculate_score(hand) > 21:
+            return self.next_split_hand()
+        return False
+
+    # Double the active hand's bet, take one card and stand
+    def split_double(self):
+        self.split["bets"][self.split["active"]] *= 2
+        self.active_split_hand().append(self.deck.pop())
+        return self.next_split_hand()
+
+    def split_results(self):
+        dealer_score = calculate_score(self.dealer_hand)
+        return [
+            (bet, get_split_hand_result(calculate_score(hand), dealer_score, len(hand)))
+            for hand, bet in zip(self.split["hands"], self.split["bets"])
+        ]
+
+    # The player's hands as they stand - one per hand after a split
+    def hands(self):
+        if self.split:
+            return self.split["hands"]
+        return [self.player_hand]
+
+    # A two-card 21 settles the game as soon as it is dealt
+    def dealt_result(self):
+        if calculate_score(self.player_hand) == 21:
+            return [(self.bet_amount, self.get_result())]
+        return None
+
+    # Apply one move, returning the finished hands as [(bet, result)] or None
+    # while the game goes on. Live games and replays both go through here, so
+    # a replay reproduces a game exactly. Checks that can turn a move down
+    # (chips, can_double_down) are the caller's - only accepted moves get here.
+    # Split hands aren't offered a forfeit, but a game abandoned after a split
+    # forfeits every hand.
+    def play(self, action):
+        if self.split and action == "forfeit":
+            return [(bet, "forfeit") for bet in self.split["bets"]]
+        if self.split or action == "split":
+            if action == "split":
+                done = self.start_split()
+            elif action == "hit":
+                done = self.split_hit()
+            elif action == "double":
+                done = self.split_double()
+            else:
+                done = self.next_split_hand()
+            if not done:
+                return None
+            self.dealer_play()
+            return self.split_results()
+
+        if action == "hit":
+            if self.hit() == "bust":
+                return [(self.bet_amount, "player_bust")]
+            return None
+        if action == "forfeit":
+            return [(self.bet_amount, "forfeit")]
+        if action == "double":
+            self.double_down()
+        self.dealer_play()
+        self.game_over = True
+        return [(self.bet_amount, self.get_result())]
+
+# Compare a finished player hand against the dealer's hand
+def get_hand_result(player_hand, dealer_hand):
+    player_score = calculate_score(player_hand)
+    dealer_score = calculate_score(dealer_hand)
+
+    if player_score > 21:
+        return "player_bust"
+    elif dealer_score > 21:
+        return "dealer_bust"
+    elif player_score == 21 and len(player_hand) == 2:
+        if dealer_score == 21 and len(dealer_hand) == 2:
+            return "push"
+        return "blackjack"
+    elif dealer_score == 21 and len(dealer_hand) == 2:
+        return "dealer_blackjack"
+    elif player_score > dealer_score:
+        return "player_wins"
+    elif dealer_score > player_score:
+        return "dealer_wins"
+    else:
+        return "push"
+
+# Multi-deck shoe shared by every seat at a table
+class Shoe:
+    def __init__(self, decks=6, penetration=0.75):
+        self.decks = decks
+        self.cut_card = int(52 * decks * (1 - penetration))
+        self.shuffle()
+
+    def shuffle(self):
+        self.cards = create_deck() * self.decks
+        random.SystemRandom().shuffle(self.cards)
+
+    def draw(self):
+        if not self.cards:
+            self.shuffle()
+        return self.cards.pop()
+
+    # Reshuffle between rounds once the cut card has come out
+    def needs_shuffle(self):
+        return len(self.cards) < self.cut_card
+
+def get_split_hand_result(hand_score, dealer_score, hand_length):
+    if hand_score > 21:
+        return "lose"  # Busted
+    elif dealer_score > 21:
+        return "win"   # Dealer busted
+    elif hand_score == 21 and hand_length == 2:
+        if dealer_score == 21:
+            return "tie"
+        return "blackjack"
+    elif hand_score > dealer_score:
+        return "win"
+    elif dealer_score > hand_score:
+        return "lose"
+    else:
+        return "tie"
+
+# Re-run a game from its seed, opening bet and ACTION_CODES letters. Returns
+# (finished hands as [(bet, result)] or None, player hands, dealer hand).
+def replay(seed, bet_amount, actions):
+    game = BlackjackGame(0, bet_amount, seed)
+    hands = game.dealt_result()
+    for code in actions:
+        hands = game.play(ACTIONS[code])
+    return hands, game.hands(), game.dealer_hand
@@ -0,0 +1,79 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+# Game lifecycle events (bets, deals, moves, settlements, store flushes,
+# failed edits) written as JSON lines. emit() only puts a record on a queue;
+# a listener thread formats and writes it, so the event loop never waits on
+# the log file.
+#
+# EVENT_LOG is the file to write, "-" for stderr or "" to turn events off.
+# The file rolls over at EVENT_LOG_MAX_BYTES, keeping EVENT_LOG_BACKUPS old ones.
+EVENT_LOG = os.getenv('EVENT_LOG', 'events.jsonl')
+EVENT_LOG_MAX_BYTES = int(os.getenv('EVENT_LOG_MAX_BYTES', str(64 * 1024 * 1024)))
+EVENT_LOG_BACKUPS = int(os.getenv('EVENT_LOG_BACKUPS', '5'))
+
+# Events are INFO records on a logger of their own, held at WARNING (so off)
+# until the log starts - discord.py's own logging setup can't switch them on
+logger = logging.getLogger("blackjack.events")
+logger.propagate = False
+logger.setLevel(logging.WARNING)
+
+listener = None
+
+# One line per event: time, event name, then the event's own fields
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        event = {"ts": round(record.created, 6), "event": record.msg}
+        event.update(record.fields)
+        return json.dumps(event, separators=(",", ":"), ensure_ascii=False, default=str)
+
+# Records go on the queue as they are - the stock handler formats them first,
+# which is the work being moved off the loop
+class EventQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        return record
+
+# Rolls over on the size of the file so far. The stock check formats every
+# record a second time just to measure it, which doubles the writer's work.
+class EventFileHandler(logging.handlers.RotatingFileHandler):
+    def shouldRollover(self, record):
+        return self.maxBytes > 0 and self.stream is not None and self.stream.tell() >= self.maxBytes
+
+# Start writing events. Until this runs, and after stop_event_log, emit() is
+# one level check.
+def start_event_log(path=EVENT_LOG):
+    global listener
+    if listener or not path:
+        return
+    if path == "-":
+        handler = logging.StreamHandler(sys.stderr)
+    else:
+        handler = EventFileHandler(path, maxBytes=EVENT_LOG_MAX_BYTES, backupCount=EVENT_LOG_BACKUPS, encoding="utf-8")
+    handler.setFormatter(JsonLineFormatter())
+
+    events = queue.SimpleQueue()
+    logger.addHandler(EventQueueHandler(events))
+    logger.setLevel(logging.INFO)
+    listener = logging.handlers.QueueListener(events, handler)
+    listener.start()
+
+# Write out the events still queued and stop the listener thread
+def stop_event_log():
+    global listener
+    if listener is None:
+        return
+    logger.setLevel(logging.WARNING)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    listener = None
+
+def emit(event, **fields):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(event, extra={"fields": fields})
@@ -0,0 +1,158 @@
+import argparse
+import csv
+import os
+
+from history import HandHistory
+from engine import calculate_score, cards_from_bytes
+from storage import STORE_BACKEND, open_store, partition_ids
+
+# Parquet output needs pyarrow, which the bot itself doesn't
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Rows read and written per step - memory stays at about one batch per table
+EXPORT_BATCH_SIZE = 5000
+
+# Exported tables and their columns as (name, type)
+TABLES = {
+    "balances": [
+        ("guild_id", "int"), ("user_id", "int"), ("chips", "int"),
+        ("wins", "int"), ("losses", "int"), ("last_daily", "str"),
+    ],
+    "stats": [
+        ("guild_id", "int"), ("user_id", "int"), ("wins", "int"), ("losses", "int"),
+    ],
+    "hands": [
+        ("id", "int"), ("user_id", "int"), ("guild_id", "int"), ("played_at", "float"), ("bet", "int"),
+        ("player_cards", "str"), ("player_total", "int"), ("dealer_cards", "str"), ("dealer_total", "int"),
+        ("actions", "str"), ("result", "str"), ("net", "int"), ("seed", "int"),
+    ],
+    "grants": [
+        ("id", "int"), ("user_id", "int"), ("guild_id", "int"), ("granted_at", "float"),
+        ("kind", "str"), ("chips", "int"), ("wins", "int"), ("losses", "int"),
+    ],
+}
+
+# Every store holding balances as (guild_id, store) - the global one has no guild
+def stores(backend):
+    for guild_id in [None] + partition_ids(backend):
+        store = open_store(backend, guild_id)
+        try:
+            yield guild_id, store
+        finally:
+            store.close()
+
+def balance_rows(backend, batch_size):
+    for guild_id, store in stores(backend):
+        for batch in store.iter_players(batch_size):
+            yield [
+                (guild_id, int(user_id), player["chips"], player["wins"], player["losses"], player.get("last_daily"))
+                for user_id, player in batch
+            ]
+
+def stats_rows(backend, batch_size):
+    for guild_id, store in stores(backend):
+        for batch in store.iter_stats(batch_size):
+            yield [(guild_id, int(user_id), stats["wins"], stats["losses"]) for user_id, stats in batch]
+
+def hand_rows(history, batch_size):
+    for batch in history.iter_hands(batch_size):
+        rows = []
+        for hand in batch:
+            player_hand = cards_from_bytes(hand["player_cards"])
+            dealer_hand = cards_from_bytes(hand["dealer_cards"])
+            rows.append((
+                hand["id"], hand["user_id"], hand["guild_id"], hand["played_at"], hand["bet"],
+                "".join(player_hand), calculate_score(player_hand), "".join(dealer_hand), calculate_score(dealer_hand),
+                hand["actions"], hand["result"], hand["net"], hand["seed"],
+            ))
+        yield rows
+
+def grant_rows(history, batch_size):
+    for batch in history.iter_grants(batch_size):
+        yield [tuple(grant[name] for name, kind in TABLES["grants"]) for grant in batch]
+
+class CsvWriter:
+    def __init__(self, path, columns):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([name for name, kind in columns])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+# Each batch becomes one row group
+class ParquetWriter:
+    TYPES = {"int": "int64", "float": "float64", "str": "string"}
+
+    def __init__(self, path, columns):
+        self.schema = pyarrow.schema([(name, self.TYPES[kind]) for name, kind in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self.writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+
+    def close(self):
+        self.writer.close()
+
+WRITERS = {"csv": CsvWriter, "parquet": ParquetWriter}
+
+# Stream one table's batches into a file per format, returning the row count
+def export_table(name, batches, out_dir, formats):
+    columns = TABLES[name]
+    writers = [WRITERS[fmt](os.path.join(out_dir, f"{name}.{fmt}"), columns) for fmt in formats]
+    count = 0
+    try:
+        for rows in batches:
+            if not rows:
+                continue
+            for writer in writers:
+                writer.write(rows)
+            count += len(rows)
+    finally:
+        for writer in writers:
+            writer.close()
+    return count
+
+def export(out_dir, formats, backend=STORE_BACKEND, batch_size=EXPORT_BATCH_SIZE):
+    os.makedirs(out_dir, exist_ok=True)
+    history = HandHistory()
+    try:
+        return {
+            "balances": export_table("balances", balance_rows(backend, batch_size), out_dir, formats),
+            "stats": export_table("stats", stats_rows(backend, batch_size), out_dir, formats),
+            "hands": export_table("hands", hand_rows(history, batch_size), out_dir, formats),
+            "grants": export_table("grants", grant_rows(history, batch_size), out_dir, formats),
+        }
+    finally:
+        history.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export balances, stats, hand history and grants for analysis")
+    parser.add_argument("out_dir", nargs="?", default="export")
+    parser.add_argument("--format", choices=("csv", "parquet"), action="append", dest="formats",
+                        help="output format, may be repeated (default: csv, plus parquet when pyarrow is installed)")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default=STORE_BACKEND)
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    formats = args.formats or (["csv", "parquet"] if pyarrow else ["csv"])
+    if "parquet" in formats and pyarrow is None:
+        parser.error("parquet output needs pyarrow (pip install pyarrow)")
+
+    counts = export(args.out_dir, formats, args.backend, args.batch_size)
+    for name, count in counts.items():
+        print(f"{name}: {count} rows -> {', '.join(os.path.join(args.out_dir, f'{name}.{fmt}') for fmt in formats)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import asyncio
+import functools
+import os
+import struct
+import time
+
+import discord
+from discord.ext import commands
+
+from edits import MessageEditQueue
+import engine
+from engine import ACTION_CODES, decode_cards, encode_cards
+from events import emit
+from history import HandHistory
+from ratelimit import RateLimiter
+from snapshots import SnapshotStore, snapshot_path
+from settlement import settle_game
+from storage import GUILD_ECONOMIES, store
+
+# Live state shared by the bot and its extensions (see cogs/). Extensions are
+# reloaded in place, this module never is - games, tables, queued edits, rate
+# limit buckets and the in-flight count all carry over a reload untouched.
+
+# --- Shard-local state ---
+# Games, tables and snapshots are partitioned by the shard that
+# owns the guild, so each shard's hot state stays local and can be inspected
+# on its own. DMs belong to shard 0.
+class ShardState:
+    def __init__(self, shard_id):
+        self.shard_id = shard_id
+        self.active_games = {}
+        self.tables = {}
+        self.snapshot_store = SnapshotStore(snapshot_path(shard_id))
+        self.snapshot_versions = {}  # user_id -> (game_id, version) last written
+        self.lock_owner = f"shard:{shard_id}"
+
+        # Metrics
+        self.games_started = 0
+        self.actions = 0
+        self.hands_settled = 0
+
+shard_states = {}
+
+def get_shard_state(shard_id):
+    state = shard_states.get(shard_id)
+    if state is None:
+        state = shard_states[shard_id] = ShardState(shard_id)
+        restore_games(state)
+    return state
+
+# Shard state for an interaction or command context
+def state_for(source):
+    guild = source.guild
+    return get_shard_state(guild.shard_id if guild else 0)
+
+# Guild id for an interaction or command context - picks the economy a player's
+# chips come from when GUILD_ECONOMIES is on (None in DMs)
+def guild_id_for(source):
+    return source.guild.id if source.guild else None
+
+# A player holds one game lock in the shared store while a game is in flight,
+# so they can't have games running on two shards at once. Each shard renews
+# its locks while it snapshots, and a dead shard's locks lapse after the TTL.
+GAME_LOCK_TTL = 60
+
+def game_lock(user_id):
+    return f"game:{user_id}"
+
+# Forget a player's game on this shard and let them start another anywhere
+def drop_game(state, user_id):
+    state.active_games.pop(user_id, None)
+    store.release_lock(game_lock(user_id), state.lock_owner)
+
+# Coalesces rapid edits of the same game message into one per rate-limit window
+edit_queue = MessageEditQueue()
+
+# Per user, channel and guild token buckets, checked before any button or
+# command does work (see ratelimit.py for the RATE_LIMIT_* settings)
+limiter = RateLimiter()
+
+def rate_limit_message(retry_after):
+    return f"⏳ Slow down! Try again in {retry_after:.0f}s." if retry_after >= 1 else "⏳ Slow down! Try again in a moment."
+
+class RateLimited(commands.CheckFailure):
+    def __init__(self, retry_after):
+        self.message = rate_limit_message(retry_after)
+        super().__init__(self.message)
+
+# Handlers that move chips, counted while they run so a shutdown can wait for
+# the ones already under way
+class InFlight:
+    def __init__(self):
+        self.count = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def track(self, handler):
+        @functools.wraps(handler)
+        async def tracked(*args, **kwargs):
+            self.count += 1
+            self.idle.clear()
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                self.count -= 1
+                if not self.count:
+                    self.idle.set()
+        return tracked
+
+in_flight = InFlight()
+
+RESTART_MESSAGE = "🔄 The bot is restarting - try again in a moment!"
+
+# Ids of the most recent interactions, so a click Discord delivers twice is only handled once
+RECENT_INTERACTIONS = 1024
+recent_interactions = {}
+
+def seen_interaction(interaction_id):
+    if interaction_id in recent_interactions:
+        return True
+    recent_interactions[interaction_id] = None
+    if len(recent_interactions) > RECENT_INTERACTIONS:
+        del recent_interactions[next(iter(recent_interactions))]
+    return False
+
+# Mixed into every button class - drops duplicate interactions and spends a rate
+# limit token before the callback runs
+class GuardedItem:
+    async def interaction_check(self, interaction):
+        if seen_interaction(interaction.id):
+            return False
+
+        if interaction.client.draining:
+            await interaction.response.send_message(RESTART_MESSAGE, ephemeral=True)
+            return False
+
+        retry_after = limiter.take(interaction.user.id, interaction.channel_id, interaction.guild_id)
+        if retry_after:
+            await interaction.response.send_message(rate_limit_message(retry_after), ephemeral=True)
+            return False
+        return True
+
+# Bet amounts offered on the bet selection menu
+BET_AMOUNTS = (25, 50, 100)
+
+# Label, style and emoji for each game action button
+GAME_BUTTONS = {
+    "hit": ("Hit", discord.ButtonStyle.primary, "🟦"),
+    "stand": ("Stand", discord.ButtonStyle.secondary, "✋"),
+    "forfeit": ("Forfeit", discord.ButtonStyle.danger, "🟥"),
+    "double": ("Double Down", discord.ButtonStyle.success, "💰"),
+    "split": ("Split", discord.ButtonStyle.blurple, "✂️"),
+}
+
+# --- Hand history ---
+# Every settled hand is logged to SQLite (see history.py) and can be paged
+# through with $bjhistory (see cogs/stats.py)
+hand_history = HandHistory()
+
+# --- Game snapshots ---
+# Live games are written to SQLite every few seconds so a restart doesn't lose
+# hands in progress or the bets already deducted for them
+SNAPSHOT_INTERVAL = float(os.getenv('SNAPSHOT_INTERVAL', '5'))
+
+# Packed game header: game id, bet, split bet, flags, active split hand. The
+# split bet is only read from snapshots of two-hand splits written before
+# split hands carried their own bets (FLAG_SPLIT without FLAG_SPLIT_HANDS).
+SNAPSHOT_HEADER = struct.Struct('<QIIBB')
+
+# Bet of one split hand, ahead of its cards
+SNAPSHOT_SPLIT_BET = struct.Struct('<I')
+
+# Trailing deck seed, for games that have one
+SNAPSHOT_SEED = struct.Struct('<Q')
+FLAG_GAME_OVER = 1
+FLAG_DOUBLED_DOWN = 2
+FLAG_SPLIT = 4
+FLAG_SPLIT_HANDS = 8
+
+def pack_game(game):
+    split = game.split
+
+    flags = 0
+    if game.game_over:
+        flags |= FLAG_GAME_OVER
+    if game.doubled_down:
+        flags |= FLAG_DOUBLED_DOWN
+    if split:
+        flags |= FLAG_SPLIT | FLAG_SPLIT_HANDS
+
+    parts = [
+        SNAPSHOT_HEADER.pack(game.game_id, game.bet_amount, 0, flags, split["active"] if split else 0),
+        encode_cards(game.player_hand),
+        encode_cards(game.dealer_hand),
+        encode_cards(game.deck)
+    ]
+    if split:
+        parts.append(bytes([len(split["hands"])]))
+        for hand, bet in zip(split["hands"], split["bets"]):
+            parts.append(SNAPSHOT_SPLIT_BET.pack(bet) + encode_cards(hand))
+    actions = game.actions.encode()
+    parts.append(bytes([len(actions)]) + actions)
+    if game.seed is not None:
+        parts.append(SNAPSHOT_SEED.pack(game.seed))
+    return b''.join(parts)
+
+def unpack_game(user_id, version, state):
+    game_id, bet_amount, split_bet, flags, split_active = SNAPSHOT_HEADER.unpack_from(state)
+    offset = SNAPSHOT_HEADER.size
+    player_hand, offset = decode_cards(state, offset)
+    dealer_hand, offset = decode_cards(state, offset)
+    deck, offset = decode_cards(state, offset)
+
+    split = None
+    if flags & FLAG_SPLIT_HANDS:
+        hands, bets = [], []
+        count = state[offset]
+        offset += 1
+        for _ in range(count):
+            bet, = SNAPSHOT_SPLIT_BET.unpack_from(state, offset)
+            hand, offset = decode_cards(state, offset + SNAPSHOT_SPLIT_BET.size)
+            hands.append(hand)
+            bets.append(bet)
+        split = {"hands": hands, "bets": bets, "active": split_active}
+    elif flags & FLAG_SPLIT:
+        hand1, offset = decode_cards(state, offset)
+        hand2, offset = decode_cards(state, offset)
+        split = {"hands": [hand1, hand2], "bets": [split_bet, split_bet], "active": split_active - 1}
+
+    # Snapshots written before the hand history have no actions, and ones
+    # written before replays no seed
+    actions = ""
+    if offset < len(state):
+        actions = state[offset + 1:offset + 1 + state[offset]].decode()
+        offset += 1 + state[offset]
+    seed = None
+    if offset < len(state):
+        seed, = SNAPSHOT_SEED.unpack_from(state, offset)
+
+    # Looked up on the module so games restored after a $bjreload of engine
+    # get the new class
+    return engine.BlackjackGame.from_snapshot(
+        user_id, game_id, version, bet_amount, player_hand, dealer_hand, deck,
+        bool(flags & FLAG_GAME_OVER), bool(flags & FLAG_DOUBLED_DOWN), actions, split, seed
+    )
+
+def restore_games(state):
+    for user_id, version, packed in state.snapshot_store.read_all():
+        try:
+            game = unpack_game(user_id, version, packed)
+        except (struct.error, IndexError):
+            forfeit_unreadable(state, user_id, packed)
+            continue
+
+        state.active_games[user_id] = game
+        store.acquire_lock(game_lock(user_id), state.lock_owner, GAME_LOCK_TTL)
+        state.snapshot_versions[user_id] = (game.game_id, game.version)
+
+    if state.active_games:
+        print(f'Restored {len(state.active_games)} in-flight games on shard {state.shard_id}')
+
+# A snapshot that can't be unpacked can't be played on, but its bet was taken
+# when the game started. If the header still gives the opening bet it is
+# settled as a forfeit, so the hand history accounts for it - unless guild
+# economies are on, as snapshots don't say which guild's balance paid it. The
+# row is deleted either way, and the event keeps the raw state for a manual fix.
+def forfeit_unreadable(state, user_id, packed):
+    bet_amount = None
+    if len(packed) >= SNAPSHOT_HEADER.size:
+        game_id, bet_amount, split_bet, flags, split_active = SNAPSHOT_HEADER.unpack_from(packed)
+    settled = bool(bet_amount) and not GUILD_ECONOMIES
+    emit("snapshot_unreadable", user_id=user_id, shard_id=state.shard_id, bet=bet_amount, settled=settled, state=packed.hex())
+    if settled:
+        settlement = settle_game(user_id, [(bet_amount, "forfeit")])
+        hand_history.record_games([(settlement, [[]], [], ACTION_CODES["forfeit"], None)])
+    state.snapshot_store.write([], [user_id])
+
+# Write every game on a shard that changed since the last flush and drop finished ones
+async def flush_snapshots(state):
+    written = {}
+    upserts = []
+    for user_id, game in state.active_games.items():
+        key = (game.game_id, game.version)
+        if state.snapshot_versions.get(user_id) != key:
+            written[user_id] = key
+            upserts.append((user_id, game.version, pack_game(game)))
+    deletes = [user_id for user_id in state.snapshot_versions if user_id not in state.active_games]
+
+    if not upserts and not deletes:
+        return
+
+    started = time.perf_counter()
+    await asyncio.to_thread(state.snapshot_store.write, upserts, deletes)
+    emit("snapshot_flush", shard_id=state.shard_id, written=len(upserts), deleted=len(deletes), ms=round((time.perf_counter() - started) * 1000, 3))
+
+    for user_id in deletes:
+        state.snapshot_versions.pop(user_id, None)
+    state.snapshot_versions.update(written)
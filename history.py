@@ -0,0 +1,173 @@
+import sqlite3
+import threading
+import time
+
+from engine import card_bytes
+
+# Log of every finished hand and every chip grant
+HISTORY_FILE = 'hand_history.db'
+
+# Stands in for a guild id to total a player's rows across every guild
+ALL_GUILDS = object()
+
+# SQLite tables with one row per settled hand and one per grant (daily bonus,
+# admin chips), shared by every shard process. Together they account for every
+# chip a player gained or lost, so balances can be reconciled against them.
+# Cards are stored as deck indices and actions as one letter each, and the
+# (user_id, id) indexes let a player's rows be paged or totalled without
+# touching anyone else's.
+class HandHistory:
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS hands ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "user_id INTEGER NOT NULL, "
+            "played_at REAL NOT NULL, "
+            "bet INTEGER NOT NULL, "
+            "player_cards BLOB NOT NULL, "
+            "dealer_cards BLOB NOT NULL, "
+            "actions TEXT NOT NULL, "
+            "result TEXT NOT NULL, "
+            "net INTEGER NOT NULL)"
+        )
+        # Hands logged before guilds or seeds were recorded have neither, and
+        # table hands, dealt from a shared shoe, never have a seed
+        columns = [row["name"] for row in self.conn.execute("PRAGMA table_info(hands)")]
+        if "guild_id" not in columns:
+            self.conn.execute("ALTER TABLE hands ADD COLUMN guild_id INTEGER")
+        if "seed" not in columns:
+            self.conn.execute("ALTER TABLE hands ADD COLUMN seed INTEGER")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS hands_by_user ON hands (user_id, id)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS grants ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "user_id INTEGER NOT NULL, "
+            "guild_id INTEGER, "
+            "granted_at REAL NOT NULL, "
+            "kind TEXT NOT NULL, "
+            "chips INTEGER NOT NULL, "
+            "wins INTEGER NOT NULL DEFAULT 0, "
+            "losses INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS grants_by_user ON grants (user_id, id)")
+        self.conn.commit()
+
+    # Add hands as (user_id, guild_id, played_at, bet, player_cards, dealer_cards, actions, result, net, seed)
+    def record(self, hands):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO hands (user_id, guild_id, played_at, bet, player_cards, dealer_cards, actions, result, net, seed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                hands
+            )
+
+    # Log finished games as (settlement, player hands, dealer hand, actions, seed),
+    # one row per hand. Games with a seed can be replayed (see replay.py); table
+    # rounds share a shoe and have none.
+    def record_games(self, games):
+        played_at = time.time()
+        rows = []
+        for settlement, hands, dealer_hand, actions, seed in games:
+            for (bet, outcome), result, net, hand in zip(settlement.hands, settlement.results, settlement.nets, hands):
+                rows.append((int(settlement.user_id), settlement.guild_id, played_at, bet, card_bytes(hand), card_bytes(dealer_hand), actions, result, net, seed))
+        self.record(rows)
+
+    # Log chips given to a player outside a hand. `kind` is "daily", "admin" or
+    # "opening" - an audit baseline that also carries wins and losses
+    def record_grant(self, user_id, guild_id, kind, chips, wins=0, losses=0):
+        self.record_grants([(user_id, guild_id, time.time(), kind, chips, wins, losses)])
+
+    # Add grants as (user_id, guild_id, granted_at, kind, chips, wins, losses)
+    def record_grants(self, grants):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO grants (user_id, guild_id, granted_at, kind, chips, wins, losses) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                grants
+            )
+
+    # Per-player totals for a batch of players as {user_id: (hands, net, wins,
+    # losses)} from the hands and {user_id: (chips, wins, losses)} from the
+    # grants. Rows are limited to one guild, or taken from every guild when
+    # `guild_id` is ALL_GUILDS.
+    def totals(self, user_ids, guild_id, win_results, loss_results):
+        users = ", ".join("?" for _ in user_ids)
+        scope, scope_params = ("", []) if guild_id is ALL_GUILDS else (" AND guild_id IS ?", [guild_id])
+        wins = ", ".join("?" for _ in win_results)
+        losses = ", ".join("?" for _ in loss_results)
+        with self.lock:
+            hands = self.conn.execute(
+                f"SELECT user_id, COUNT(*), SUM(net), SUM(result IN ({wins})), SUM(result IN ({losses})) "
+                f"FROM hands WHERE user_id IN ({users}){scope} GROUP BY user_id",
+                list(win_results) + list(loss_results) + list(user_ids) + scope_params
+            ).fetchall()
+            grants = self.conn.execute(
+                f"SELECT user_id, SUM(chips), SUM(wins), SUM(losses) "
+                f"FROM grants WHERE user_id IN ({users}){scope} GROUP BY user_id",
+                list(user_ids) + scope_params
+            ).fetchall()
+        return (
+            {row[0]: tuple(row[1:]) for row in hands},
+            {row[0]: tuple(row[1:]) for row in grants},
+        )
+
+    # Up to `limit` of a player's hands, newest first. `before` pages towards
+    # older hands and `after` towards newer ones, each from a hand id.
+    def page(self, user_id, limit, before=None, after=None):
+        with self.lock:
+            if after is not None:
+                rows = self.conn.execute(
+                    "SELECT * FROM hands WHERE user_id = ? AND id > ? ORDER BY id ASC LIMIT ?",
+                    (user_id, after, limit)
+                ).fetchall()
+                return rows[::-1]
+
+            if before is None:
+                rows = self.conn.execute(
+                    "SELECT * FROM hands WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                    (user_id, limit)
+                ).fetchall()
+            else:
+                rows = self.conn.execute(
+                    "SELECT * FROM hands WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                    (user_id, before, limit)
+                ).fetchall()
+            return rows
+
+    # Every row of a table in id order, read `batch_size` rows at a time so an
+    # export never holds the whole table or the lock for long
+    def _iter_rows(self, table, batch_size):
+        last_id = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT * FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1]["id"]
+
+    def iter_hands(self, batch_size):
+        return self._iter_rows("hands", batch_size)
+
+    def iter_grants(self, batch_size):
+        return self._iter_rows("grants", batch_size)
+
+    # Whether a player has any hands on the far side of a hand id
+    def has_older(self, user_id, hand_id):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM hands WHERE user_id = ? AND id < ? LIMIT 1", (user_id, hand_id)).fetchone() is not None
+
+    def has_newer(self, user_id, hand_id):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM hands WHERE user_id = ? AND id > ? LIMIT 1", (user_id, hand_id)).fetchone() is not None
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,180 @@
+import datetime
+import os
+import sqlite3
+import threading
+
+from storage import store
+
+# Pre-aggregated leaderboard buckets
+LEADERBOARD_FILE = 'leaderboards.db'
+
+# Hands a player needs in a period before they are ranked by win rate
+MIN_GAMES = int(os.getenv('LEADERBOARD_MIN_GAMES', '10'))
+
+# Boards and the period bucket each one reads
+BOARDS = ("daily", "weekly", "all-time")
+
+# Sort key for each metric, highest ranked first, as expressions over a row's
+# wins, games, net and user_id. The user id breaks ties so every player has one
+# place to page from. Wins and net walk an index; win rate sorts the period's
+# qualifying rows.
+RANKINGS = {
+    "wins": ("{wins}", "-{user_id}"),
+    "net": ("{net}", "-{user_id}"),
+    "winrate": ("CAST({wins} AS REAL) / {games}", "{games}", "-{user_id}"),
+}
+ROW_COLUMNS = {"wins": "wins", "games": "games", "net": "net", "user_id": "buckets.user_id"}
+CURSOR_PARAMS = {"wins": ":wins", "games": ":games", "net": ":net", "user_id": ":user_id"}
+
+def period_keys(day):
+    year, week, weekday = day.isocalendar()
+    return {"daily": f"d:{day.isoformat()}", "weekly": f"w:{year}-W{week:02d}", "all-time": "all"}
+
+# One row per (period, player) holding that period's totals. Settlement adds to
+# today's, this week's and the all-time row, so every board is an indexed top-k
+# read. Day and week rows older than the previous period are deleted whenever
+# a new day starts.
+#
+# Server boards rank the same rows, limited to the guild's members. A player
+# becomes a member of a guild's board by settling a hand there, and is removed
+# when they leave the guild or are found gone when a page is drawn.
+class LeaderboardStore:
+    # The database is opened on first use, not on import, so tools that only
+    # import settlement never create it. A new database is seeded from
+    # load_stats.
+    def __init__(self, path=LEADERBOARD_FILE, load_stats=None):
+        self.path = path
+        self.load_stats = load_stats
+        self.lock = threading.Lock()
+        self.conn = None
+        self.current_day = None
+
+    # The open connection - callers hold self.lock
+    def _connect(self):
+        if self.conn is not None:
+            return self.conn
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "period TEXT NOT NULL, "
+            "user_id INTEGER NOT NULL, "
+            "wins INTEGER NOT NULL, "
+            "losses INTEGER NOT NULL, "
+            "games INTEGER NOT NULL, "
+            "net INTEGER NOT NULL, "
+            "PRIMARY KEY (period, user_id))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS buckets_by_wins ON buckets (period, wins DESC)")
+        conn.execute("CREATE INDEX IF NOT EXISTS buckets_by_net ON buckets (period, net DESC)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS members ("
+            "guild_id INTEGER NOT NULL, "
+            "user_id INTEGER NOT NULL, "
+            "PRIMARY KEY (guild_id, user_id))"
+        )
+        conn.commit()
+        if self.load_stats:
+            self._seed(conn, self.load_stats)
+        self.conn = conn
+        return conn
+
+    # Open the database now - settlement does before its first batch, so the
+    # seed reads balances from before that batch rather than counting it twice
+    def open(self):
+        with self.lock:
+            self._connect()
+
+    # Start the all-time board from the lifetime counters kept before buckets existed
+    def _seed(self, conn, load_stats):
+        with conn:
+            if conn.execute("SELECT 1 FROM buckets LIMIT 1").fetchone():
+                return
+            stats = load_stats()
+            conn.executemany(
+                "INSERT OR IGNORE INTO buckets (period, user_id, wins, losses, games, net) VALUES ('all', ?, ?, ?, ?, 0)",
+                [(int(user_id), s["wins"], s["losses"], s["wins"] + s["losses"]) for user_id, s in stats.items()]
+            )
+
+    # Add a batch of settlements to the current day, week and all-time rows
+    def record(self, settlements, day=None):
+        day = day or datetime.date.today()
+        if day != self.current_day:
+            self.current_day = day
+            self.prune(day)
+
+        rows = []
+        for period in period_keys(day).values():
+            for settlement in settlements:
+                rows.append((period, int(settlement.user_id), settlement.wins, settlement.losses, len(settlement.hands), settlement.net))
+        members = [(settlement.guild_id, int(settlement.user_id)) for settlement in settlements if settlement.guild_id]
+
+        with self.lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO buckets (period, user_id, wins, losses, games, net) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(period, user_id) DO UPDATE SET "
+                "wins = wins + excluded.wins, losses = losses + excluded.losses, "
+                "games = games + excluded.games, net = net + excluded.net",
+                rows
+            )
+            conn.executemany("INSERT OR IGNORE INTO members (guild_id, user_id) VALUES (?, ?)", members)
+
+    def remove_member(self, guild_id, user_id):
+        self.remove_members(guild_id, [user_id])
+
+    def remove_members(self, guild_id, user_ids):
+        with self.lock, self._connect() as conn:
+            conn.executemany("DELETE FROM members WHERE guild_id = ? AND user_id = ?", [(guild_id, user_id) for user_id in user_ids])
+
+    # Drop day and week rows from before yesterday and last week
+    def prune(self, day):
+        yesterday = period_keys(day - datetime.timedelta(days=1))["daily"]
+        last_week = period_keys(day - datetime.timedelta(weeks=1))["weekly"]
+        with self.lock, self._connect() as conn:
+            conn.execute("DELETE FROM buckets WHERE period LIKE 'd:%' AND period < ?", (yesterday,))
+            conn.execute("DELETE FROM buckets WHERE period LIKE 'w:%' AND period < ?", (last_week,))
+
+    # FROM/WHERE clause and parameters for a board, optionally limited to a guild
+    def _board(self, board, metric, guild_id, day):
+        params = {"period": period_keys(day or datetime.date.today())[board], "min_games": MIN_GAMES if metric == "winrate" else 1}
+        if guild_id:
+            params["guild_id"] = guild_id
+            return (
+                "buckets JOIN members ON members.user_id = buckets.user_id AND members.guild_id = :guild_id "
+                "WHERE period = :period AND games >= :min_games",
+                params
+            )
+        return "buckets WHERE period = :period AND games >= :min_games", params
+
+    # Up to `limit` rows of (user_id, wins, losses, games, net) in rank order.
+    # `after` pages down the board and `before` back up it, each from a row
+    # as (wins, games, net, user_id) - no OFFSET, so deep pages cost the same
+    # as the first.
+    def page(self, board, metric, limit, before=None, after=None, guild_id=None, day=None):
+        source, params = self._board(board, metric, guild_id, day)
+        row_key = ", ".join(key.format(**ROW_COLUMNS) for key in RANKINGS[metric])
+        order = "DESC"
+        cursor = after or before
+        if cursor:
+            params.update(zip(("wins", "games", "net", "user_id"), cursor))
+            cursor_key = ", ".join(key.format(**CURSOR_PARAMS) for key in RANKINGS[metric])
+            source += f" AND ({row_key}) {'<' if after else '>'} ({cursor_key})"
+            if before:
+                order = "ASC"
+        order_by = ", ".join(f"{key.format(**ROW_COLUMNS)} {order}" for key in RANKINGS[metric])
+        params["limit"] = limit
+        with self.lock:
+            rows = self._connect().execute(
+                f"SELECT buckets.user_id, wins, losses, games, net FROM {source} ORDER BY {order_by} LIMIT :limit",
+                params
+            ).fetchall()
+        return rows[::-1] if before else rows
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+leaderboards = LeaderboardStore(load_stats=store.stats)
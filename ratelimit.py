@@ -0,0 +1,65 @@
+import os
+import time
+
+# Default limits as "<actions>/<seconds>" - a burst of that many actions, with
+# tokens refilling evenly over the period. "off" disables a limit.
+USER_LIMIT = os.getenv('RATE_LIMIT_USER', '8/10')
+CHANNEL_LIMIT = os.getenv('RATE_LIMIT_CHANNEL', '30/10')
+GUILD_LIMIT = os.getenv('RATE_LIMIT_GUILD', '120/10')
+
+# Seconds between sweeps that forget buckets which have refilled
+PRUNE_INTERVAL = 60
+
+# Token buckets for one kind of key (user, channel or guild). A key without a
+# bucket is full, so idle keys cost nothing and get dropped on the next sweep.
+class RateLimit:
+    def __init__(self, actions, seconds):
+        self.burst = actions
+        self.rate = actions / seconds
+        self.buckets = {}  # key -> (tokens, monotonic time they were counted)
+        self.next_prune = 0
+
+    def tokens(self, key, now):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            return self.burst
+        tokens, counted = bucket
+        return min(self.burst, tokens + (now - counted) * self.rate)
+
+    def spend(self, key, tokens, now):
+        self.buckets[key] = (tokens - 1, now)
+        if now >= self.next_prune:
+            self.next_prune = now + PRUNE_INTERVAL
+            self.buckets = {key: bucket for key, bucket in self.buckets.items() if self.tokens(key, now) < self.burst}
+
+def parse_limit(text):
+    if text.lower() in ('off', '0', ''):
+        return None
+    actions, seconds = text.split('/')
+    return RateLimit(int(actions), float(seconds))
+
+# Every action spends one token from the user's, the channel's and the guild's
+# bucket. It only goes ahead if all three have a token, otherwise nothing is
+# spent and the caller learns how long until it would be allowed.
+class RateLimiter:
+    def __init__(self, user=USER_LIMIT, channel=CHANNEL_LIMIT, guild=GUILD_LIMIT):
+        self.user = parse_limit(user)
+        self.channel = parse_limit(channel)
+        self.guild = parse_limit(guild)
+
+    # Returns 0 if the action may go ahead, otherwise the seconds to wait
+    def take(self, user_id, channel_id, guild_id):
+        now = time.monotonic()
+        checks = [
+            (limit, key) for limit, key in ((self.user, user_id), (self.channel, channel_id), (self.guild, guild_id))
+            if limit is not None and key is not None
+        ]
+
+        available = [limit.tokens(key, now) for limit, key in checks]
+        retry_after = max([(1 - tokens) / limit.rate for (limit, key), tokens in zip(checks, available) if tokens < 1], default=0)
+        if retry_after:
+            return retry_after
+
+        for (limit, key), tokens in zip(checks, available):
+            limit.spend(key, tokens, now)
+        return 0
@@ -0,0 +1,138 @@
+import functools
+from collections import namedtuple
+
+import discord
+
+from cardimages import CARD_IMAGES
+from engine import calculate_score
+
+# Embeds for single-player and split games. Callers describe what to show as
+# an immutable view (namedtuples of card tuples, totals and text), and each
+# render_* function turns a view into an embed. Renders are memoized on the
+# view, so drawing the same state again - a coalesced edit, a retry, the
+# fallback path - returns the embed already built. Cached embeds are shared:
+# send them as they are, never modify them.
+RENDER_CACHE_SIZE = 1024
+
+# Picture of the hands attached in image mode (see cardimages.py)
+TABLE_IMAGE = "table.png"
+
+# Static parts, built once
+GAME_COLOR = discord.Color.dark_red()
+SPLIT_COLOR = discord.Color.blue()
+PLAYER_FIELD = "👤 Player Hand"
+DEALER_FIELD = "🏛️ Dealer Hand"
+SPLIT_RESULT_MARKS = {"win": "🟢", "blackjack": "🟢", "lose": "🔴", "tie": "🟡"}
+FINAL_RESULT_FIELD = "💰 Final Result"
+
+# Per end result: color, emoji and how the player is named in the status line
+RESULT_STYLES = {
+    "win": (discord.Color.green(), "🎉", "{mention} wins!"),
+    "lose": (discord.Color.red(), "💔", "{mention} loses!"),
+    "forfeit": (discord.Color.red(), "🏳️", "{mention} forfeited!"),
+    "tie": (discord.Color.orange(), "🤝", "It's a tie!"),
+}
+
+# A hand as shown - its cards and their total, worked out once
+Hand = namedtuple("Hand", "cards total")
+
+def hand_of(cards):
+    return Hand(tuple(cards), calculate_score(cards))
+
+# A single-hand game in play, or finished when the dealer's hand is shown
+GameView = namedtuple("GameView", "username player dealer dealer_hidden")
+
+# A finished single-hand game. The sassy line is picked by the caller so the
+# view, and with it the render, stays the same on every redraw.
+ResultView = namedtuple("ResultView", "username mention player dealer result bet_amount sassy_line")
+
+# Split hands in play with their bets, `active` being the index of the hand
+# being played
+SplitView = namedtuple("SplitView", "username hands bets active dealer")
+
+# Every split hand settled, with their results and the chips won or lost
+SplitResultView = namedtuple("SplitResultView", "username hands results dealer net wins losses")
+
+# Card glyphs then the total, or just the total when the hands are drawn as a picture
+def hand_value(cards, total):
+    return total if CARD_IMAGES else f"{''.join(cards)} {total}"
+
+def _dealer_value(dealer, hidden):
+    if hidden:
+        return hand_value([f"{dealer.cards[0]} ❓"], f"({calculate_score(dealer.cards[:1])} + ?)")
+    return hand_value(dealer.cards, f"({dealer.total})")
+
+def _new_embed(title, color):
+    embed = discord.Embed(title=title, color=color)
+    if CARD_IMAGES:
+        embed.set_image(url=f"attachment://{TABLE_IMAGE}")
+    return embed
+
+def _add_game_fields(embed, view):
+    embed.add_field(name=PLAYER_FIELD, value=hand_value(view.player.cards, f"({view.player.total})"), inline=False)
+    embed.add_field(name=DEALER_FIELD, value=_dealer_value(view.dealer, view.dealer_hidden), inline=False)
+
+@functools.lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_game(view):
+    embed = _new_embed(f"🎰 {view.username}'s Blackjack Table 🎰", GAME_COLOR)
+    _add_game_fields(embed, view)
+    return embed
+
+@functools.lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_result(view):
+    color, emoji, status = RESULT_STYLES[view.result]
+    embed = _new_embed(f"🎰 {view.username}'s Blackjack Table 🎰", color)
+    _add_game_fields(embed, GameView(view.username, view.player, view.dealer, False))
+
+    if view.result == "win":
+        # Blackjack (21 with 2 cards) pays 1.5x profit, a regular win 1x
+        if view.player.total == 21 and len(view.player.cards) == 2:
+            chip_text = f"💰 **+{int(view.bet_amount * 1.5)} chips** (Blackjack bonus!)"
+        else:
+            chip_text = f"💰 **+{view.bet_amount} chips**"
+    elif view.result in ("lose", "forfeit"):
+        chip_text = f"💸 **-{view.bet_amount} chips**"
+    else:
+        chip_text = "💰 **±0 chips** (Bet returned)"
+
+    embed.add_field(
+        name=f"{emoji} Game Over!",
+        value=f"**{status.format(mention=view.mention)}**\n{chip_text}\n\n*{view.sassy_line}*",
+        inline=False
+    )
+    return embed
+
+@functools.lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_split(view):
+    embed = _new_embed(f"🃏 {view.username}'s Split Hands 🃏", SPLIT_COLOR)
+    for index, (split_hand, bet) in enumerate(zip(view.hands, view.bets)):
+        status = " (BUST)" if split_hand.total > 21 else ""
+        active = " 👈 **ACTIVE**" if index == view.active else ""
+        embed.add_field(
+            name=f"✋ Hand {index + 1} - {bet} chips{active}",
+            value=hand_value(split_hand.cards, f"({split_hand.total}){status}"),
+            inline=False
+        )
+
+    # Dealer hand (keep hidden)
+    embed.add_field(name=DEALER_FIELD, value=_dealer_value(view.dealer, True), inline=False)
+    return embed
+
+@functools.lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_split_result(view):
+    embed = _new_embed(f"🃏 {view.username}'s Split Results 🃏", SPLIT_COLOR)
+    for number, (split_hand, result) in enumerate(zip(view.hands, view.results), 1):
+        embed.add_field(
+            name=f"✋ Hand {number} {SPLIT_RESULT_MARKS.get(result, '🟡')}",
+            value=f"{hand_value(split_hand.cards, f'({split_hand.total})')}\n**{result.upper()}**",
+            inline=False
+        )
+    embed.add_field(name=DEALER_FIELD, value=hand_value(view.dealer.cards, f"({view.dealer.total})"), inline=False)
+
+    chip_text = f"+{view.net}" if view.net > 0 else str(view.net)
+    embed.add_field(
+        name=FINAL_RESULT_FIELD,
+        value=f"**{chip_text} chips**\nWins: {view.wins} | Losses: {view.losses}",
+        inline=False
+    )
+    return embed
@@ -0,0 +1,119 @@
+import argparse
+import importlib
+import importlib.util
+import sys
+import time
+
+from engine import card_bytes
+from history import HandHistory
+from settlement import Settlement
+
+# Hand rows read from the history per step
+REPLAY_BATCH_SIZE = 10000
+
+# Mismatches printed in full before only being counted
+REPLAY_SHOW = 20
+
+# An engine to replay against - a module name like "engine", or a path to a
+# .py file holding a candidate build. It needs replay(seed, bet, actions)
+# returning (hands as [(bet, result)] or None, player hands, dealer hand).
+def load_engine(name):
+    if not name.endswith(".py"):
+        return importlib.import_module(name)
+    spec = importlib.util.spec_from_file_location("candidate_engine", name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# Recorded games as lists of their hand rows. A game's hands are logged
+# together, so they sit next to each other in id order and share a seed.
+# Hands without a seed (table rounds, older hands) can't be replayed and are
+# only counted.
+def recorded_games(history, batch_size, skipped):
+    game = []
+    for batch in history.iter_hands(batch_size):
+        for hand in batch:
+            if hand["seed"] is None:
+                skipped[0] += 1
+                continue
+            if game and (hand["user_id"], hand["seed"]) != (game[0]["user_id"], game[0]["seed"]):
+                yield game
+                game = []
+            game.append(hand)
+    if game:
+        yield game
+
+# Per hand: bet, result, net, player cards and dealer cards
+def recorded_outcome(rows):
+    return [(row["bet"], row["result"], row["net"], bytes(row["player_cards"]), bytes(row["dealer_cards"])) for row in rows]
+
+def replayed_outcome(hands, player_hands, dealer_hand):
+    settlement = Settlement(0, hands)
+    return [
+        (bet, result, net, card_bytes(hand), card_bytes(dealer_hand))
+        for (bet, result), net, hand in zip(hands, settlement.nets, player_hands)
+    ]
+
+# The history logs each hand's bet after any double down. A hand can only be
+# doubled once, so while fewer hands were doubled than played the smallest bet
+# is the opening one; otherwise it is half of it.
+def opening_bet(rows):
+    bet = min(row["bet"] for row in rows)
+    return bet // 2 if rows[0]["actions"].count("D") >= len(rows) else bet
+
+# Replay one recorded game, returning a description of how it differs or None
+def check_game(engine, rows, timer):
+    first = rows[0]
+    bet = opening_bet(rows)
+
+    started = time.perf_counter()
+    try:
+        hands, player_hands, dealer_hand = engine.replay(first["seed"], bet, first["actions"])
+    except Exception as e:
+        return f"replay raised {e!r}"
+    finally:
+        timer[0] += time.perf_counter() - started
+
+    if hands is None:
+        return "replayed game did not finish"
+    recorded = recorded_outcome(rows)
+    replayed = replayed_outcome(hands, player_hands, dealer_hand)
+    if recorded != replayed:
+        return f"recorded {recorded} but replayed {replayed}"
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded games and check they come out the same")
+    parser.add_argument("--engine", default="engine", help="module name or .py file to replay with (default: engine)")
+    parser.add_argument("--batch-size", type=int, default=REPLAY_BATCH_SIZE)
+    parser.add_argument("--limit", type=int, help="stop after this many games")
+    parser.add_argument("--show", type=int, default=REPLAY_SHOW, help="mismatches to print in full")
+    args = parser.parse_args()
+
+    engine = load_engine(args.engine)
+    history = HandHistory()
+    games = hands = mismatches = 0
+    skipped = [0]
+    timer = [0.0]
+
+    started = time.perf_counter()
+    for rows in recorded_games(history, args.batch_size, skipped):
+        if args.limit is not None and games >= args.limit:
+            break
+        games += 1
+        hands += len(rows)
+        problem = check_game(engine, rows, timer)
+        if problem:
+            mismatches += 1
+            if mismatches <= args.show:
+                print(f"Hand #{rows[0]['id']} (user {rows[0]['user_id']}, seed {rows[0]['seed']}): {problem}")
+    elapsed = time.perf_counter() - started
+    history.close()
+
+    print(f"Replayed {games} games ({hands} hands) with {args.engine}: {mismatches} mismatched, {skipped[0]} hands without a seed skipped")
+    if games:
+        print(f"Throughput: {games / elapsed:,.0f} games/s overall, {games / timer[0]:,.0f} games/s in the engine ({elapsed:.2f}s total)")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
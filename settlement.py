@@ -0,0 +1,81 @@
+from events import emit
+from leaderboards import leaderboards
+from storage import store_for
+
+# Chips paid back per chip bet, original bet included
+PAYOUTS = {
+    "blackjack": 2.5,
+    "win": 2,
+    "push": 1,
+    "lose": 0,
+}
+
+# Game results (BlackjackGame.get_result, split hand results, forfeits) mapped to payout outcomes
+OUTCOMES = {
+    "blackjack": "blackjack",
+    "player_wins": "win",
+    "dealer_bust": "win",
+    "win": "win",
+    "push": "push",
+    "tie": "push",
+    "player_bust": "lose",
+    "dealer_wins": "lose",
+    "dealer_blackjack": "lose",
+    "lose": "lose",
+    "forfeit": "lose",
+}
+
+# A finished game for one player - any number of (bet, result) hands, played in
+# a guild (None for DMs)
+class Settlement:
+    def __init__(self, user_id, hands, guild_id=None):
+        self.user_id = str(user_id)
+        self.guild_id = guild_id
+        self.results = [result for bet, result in hands]
+        self.hands = [(bet, OUTCOMES[result]) for bet, result in hands]
+        self.nets = [int(bet * PAYOUTS[outcome]) - bet for bet, outcome in self.hands]
+        self.bet_total = sum(bet for bet, outcome in self.hands)
+        self.net = sum(self.nets)
+        self.payout = self.bet_total + self.net
+        self.wins = sum(1 for bet, outcome in self.hands if outcome in ("win", "blackjack"))
+        self.losses = sum(1 for bet, outcome in self.hands if outcome == "lose")
+        self.chips = None  # Balance after settling, filled in by settle_games
+
+# Apply chips and both stat counters for a batch of finished games with one
+# store update per storage partition, however many games resolved together,
+# then add them to the leaderboard buckets and the event log
+def settle_games(settlements):
+    leaderboards.open()
+
+    # With guild economies each guild's settlements go to its own partition
+    batches = {}
+    for settlement in settlements:
+        batches.setdefault(store_for(settlement.guild_id), []).append(settlement)
+
+    for store, batch in batches.items():
+        _settle_batch(store, batch)
+    for settlement in settlements:
+        emit("settle", user_id=settlement.user_id, guild_id=settlement.guild_id, bet=settlement.bet_total, net=settlement.net, chips=settlement.chips, results=settlement.results)
+
+    leaderboards.record(settlements)
+    return settlements
+
+def _settle_batch(store, settlements):
+    user_ids = list(dict.fromkeys(settlement.user_id for settlement in settlements))
+
+    def apply(players, stats):
+        for settlement in settlements:
+            player = players[settlement.user_id]
+            player["chips"] += settlement.payout
+            player["wins"] = player.get("wins", 0) + settlement.wins
+            player["losses"] = player.get("losses", 0) + settlement.losses
+            settlement.chips = player["chips"]
+
+            user_stats = stats[settlement.user_id]
+            user_stats["wins"] += settlement.wins
+            user_stats["losses"] += settlement.losses
+
+    store.update(user_ids, apply, stats=True)
+
+def settle_game(user_id, hands, guild_id=None):
+    return settle_games([Settlement(user_id, hands, guild_id)])[0]
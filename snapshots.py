@@ -0,0 +1,58 @@
+import glob
+import re
+import sqlite3
+import threading
+
+# Snapshot database for in-flight games, one per shard
+SNAPSHOT_FILE = 'game_snapshots-{shard_id}.db'
+
+def snapshot_path(shard_id):
+    return SNAPSHOT_FILE.format(shard_id=shard_id)
+
+# Shard ids that have a snapshot database on disk
+def snapshot_shards():
+    pattern = re.compile(re.escape(SNAPSHOT_FILE).replace(re.escape('{shard_id}'), r'([0-9]+)') + '$')
+    shard_ids = []
+    for path in glob.glob(SNAPSHOT_FILE.format(shard_id='*')):
+        match = pattern.search(path)
+        if match:
+            shard_ids.append(int(match.group(1)))
+    return sorted(shard_ids)
+
+# SQLite table of packed game states keyed by user id. Writes are incremental:
+# each flush only upserts games whose version changed and deletes finished ones.
+class SnapshotStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS games ("
+            "user_id INTEGER PRIMARY KEY, "
+            "version INTEGER NOT NULL, "
+            "state BLOB NOT NULL)"
+        )
+        self.conn.commit()
+
+    # Apply one batch of changes in a single transaction
+    def write(self, upserts, deletes):
+        with self.lock, self.conn:
+            if upserts:
+                self.conn.executemany(
+                    "INSERT INTO games (user_id, version, state) VALUES (?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET version = excluded.version, state = excluded.state",
+                    upserts
+                )
+            if deletes:
+                self.conn.executemany("DELETE FROM games WHERE user_id = ?", [(user_id,) for user_id in deletes])
+
+    # Load every saved game as (user_id, version, state)
+    def read_all(self):
+        with self.lock:
+            return self.conn.execute("SELECT user_id, version, state FROM games").fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,501 @@
+import datetime
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from events import emit
+
+# File paths
+PLAYER_DATA_FILE = 'player_data.json'
+BLACKJACK_DATA_FILE = 'blackjack_data.json'
+STORE_DB_FILE = os.getenv('BLACKJACK_DB', 'blackjack.db')
+
+# Storage backend - "json" keeps the local data files and suits a single bot
+# process, "sqlite" shares one database between every shard process on the host
+STORE_BACKEND = os.getenv('BLACKJACK_STORE', 'json')
+
+# With GUILD_ECONOMIES=1 every guild gets its own balances and stats, kept in
+# their own partition (player_data-<guild id>.json or blackjack-<guild id>.db).
+# DMs keep using the global data.
+GUILD_ECONOMIES = os.getenv('GUILD_ECONOMIES', '0') == '1'
+
+# Seconds the JSON store buffers changes in memory before writing them out
+# (0 writes every change straight to disk)
+STORE_FLUSH_INTERVAL = float(os.getenv('STORE_FLUSH_INTERVAL', '2'))
+
+# Attempts at an optimistic update before giving up on a contended record
+UPDATE_RETRIES = 10
+
+# Chips a new player starts with
+STARTING_CHIPS = 500
+
+def new_player():
+    return {"chips": STARTING_CHIPS, "wins": 0, "losses": 0}
+
+def new_stats():
+    return {"wins": 0, "losses": 0}
+
+# Raised when a record kept changing under an update until the retries ran out
+class StoreConflict(Exception):
+    pass
+
+def _load_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+# Write to a temp file and swap it in, so a crash mid-write never leaves a truncated file
+def _write_file(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _save_json(path, data):
+    _write_file(path, json.dumps(data, indent=4))
+
+def _batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+# A data file's name for one guild's partition, e.g. player_data-1234.json
+def partition_path(path, guild_id):
+    root, ext = os.path.splitext(path)
+    return f"{root}-{guild_id}{ext}"
+
+# Both backends hold player records (chips, wins, losses, last_daily), per-user
+# blackjack stats and named locks with an owner and an expiry. Every write goes
+# through update(user_ids, fn): fn gets {user_id: player} and {user_id: stats}
+# (stats only when asked for), changes them in place, and the changed records
+# are saved as one atomic step.
+
+# Local JSON files, serialised by a lock - one process only. With write-behind
+# the files are read once and kept in memory; updates only mark them dirty and
+# flush() writes them out, so a burst of updates costs one file write.
+class JsonStore:
+    def __init__(self, player_path=PLAYER_DATA_FILE, stats_path=BLACKJACK_DATA_FILE, write_behind=STORE_FLUSH_INTERVAL > 0):
+        self.player_path = player_path
+        self.stats_path = stats_path
+        self.write_behind = write_behind
+        self.lock = threading.Lock()
+        self.locks = {}  # lock name -> (owner, expires_at)
+        self.cache = {}  # path -> data, while buffering
+        self.dirty = set()  # paths with changes not yet on disk
+        self.flush_lock = threading.Lock()
+
+    def _load(self, path):
+        if not self.write_behind:
+            return _load_json(path)
+        if path not in self.cache:
+            self.cache[path] = _load_json(path)
+        return self.cache[path]
+
+    def _save(self, path, data):
+        if self.write_behind:
+            self.dirty.add(path)
+        else:
+            _save_json(path, data)
+
+    # Copies of the records, not the cached ones updates write to, so readers
+    # never see an update half applied
+    def players(self):
+        with self.lock:
+            return {user_id: dict(record) for user_id, record in self._load(self.player_path).items()}
+
+    def stats(self):
+        with self.lock:
+            return {user_id: dict(record) for user_id, record in self._load(self.stats_path).items()}
+
+    # Copies of every player and stats record taken under one lock, so the two
+    # agree with each other. Records are flat, so copying is quick and updates
+    # only wait for the copy, not for whatever the caller does with it.
+    def snapshot(self):
+        with self.lock:
+            players = {user_id: dict(record) for user_id, record in self._load(self.player_path).items()}
+            stats = {user_id: dict(record) for user_id, record in self._load(self.stats_path).items()}
+        return players, stats
+
+    # Replace every record, e.g. from a backup
+    def restore(self, players, stats):
+        with self.lock:
+            if self.write_behind:
+                self.cache[self.player_path] = players
+                self.cache[self.stats_path] = stats
+            self._save(self.player_path, players)
+            self._save(self.stats_path, stats)
+        self.flush()
+
+    # Records in batches of (user_id, record). The file is already in memory,
+    # so this only keeps batches small for the caller.
+    def iter_players(self, batch_size):
+        return _batches(sorted(self.players().items()), batch_size)
+
+    def iter_stats(self, batch_size):
+        return _batches(sorted(self.stats().items()), batch_size)
+
+    def player(self, user_id):
+        with self.lock:
+            record = self._load(self.player_path).get(user_id)
+            return dict(record) if record else None
+
+    def user_stats(self, user_id):
+        with self.lock:
+            record = self._load(self.stats_path).get(user_id)
+            return dict(record) if record else None
+
+    def update(self, user_ids, fn, stats=False):
+        with self.lock:
+            player_data = self._load(self.player_path)
+            stats_data = self._load(self.stats_path) if stats else {}
+
+            # Only the records handed to fn can change, so only they are compared
+            def touched():
+                return json.dumps([[player_data.get(user_id) for user_id in user_ids], [stats_data.get(user_id) for user_id in user_ids]])
+
+            before = touched()
+            players = {user_id: player_data.setdefault(user_id, new_player()) for user_id in user_ids}
+            user_stats = {user_id: stats_data.setdefault(user_id, new_stats()) for user_id in user_ids} if stats else {}
+            result = fn(players, user_stats)
+
+            if touched() != before:
+                self._save(self.player_path, player_data)
+                if stats:
+                    self._save(self.stats_path, stats_data)
+            return result
+
+    # Write out buffered changes. Files are serialised under the data lock but
+    # written outside it, so updates don't wait on the disk.
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                pending = [(path, json.dumps(self.cache[path], indent=4)) for path in self.dirty]
+                self.dirty.clear()
+            if not pending:
+                return
+            started = time.perf_counter()
+            for path, text in pending:
+                _write_file(path, text)
+            emit("store_flush", files=len(pending), ms=round((time.perf_counter() - started) * 1000, 3))
+
+    def acquire_lock(self, name, owner, ttl):
+        now = time.time()
+        with self.lock:
+            holder = self.locks.get(name)
+            if holder and holder[0] != owner and holder[1] > now:
+                return False
+            self.locks[name] = (owner, now + ttl)
+            return True
+
+    def renew_locks(self, names, owner, ttl):
+        expires_at = time.time() + ttl
+        with self.lock:
+            for name in names:
+                if self.locks.get(name, (None,))[0] == owner:
+                    self.locks[name] = (owner, expires_at)
+
+    def release_lock(self, name, owner):
+        with self.lock:
+            if self.locks.get(name, (None,))[0] == owner:
+                del self.locks[name]
+
+    # Names of unexpired locks starting with a prefix
+    def held_locks(self, prefix):
+        now = time.time()
+        with self.lock:
+            return [name for name, (owner, expires_at) in self.locks.items() if name.startswith(prefix) and expires_at > now]
+
+    def close(self):
+        self.flush()
+
+# One SQLite database shared by every process on the host. Each record carries
+# a version; an update only lands if the versions it read are still current,
+# otherwise it re-reads and tries again, so two processes settling or debiting
+# the same player can never both spend the same chips.
+class SqliteStore:
+    RECORDS = {"players": new_player, "stats": new_stats}
+
+    def __init__(self, path=STORE_DB_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for table in self.RECORDS:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "user_id TEXT PRIMARY KEY, "
+                "version INTEGER NOT NULL, "
+                "data TEXT NOT NULL)"
+            )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS locks ("
+            "name TEXT PRIMARY KEY, "
+            "owner TEXT NOT NULL, "
+            "expires_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    # {user_id: (version, data)} for some users, or for everyone
+    def _read(self, table, user_ids=None):
+        if user_ids is None:
+            rows = self.conn.execute(f"SELECT user_id, version, data FROM {table}").fetchall()
+        else:
+            placeholders = ", ".join("?" for _ in user_ids)
+            rows = self.conn.execute(
+                f"SELECT user_id, version, data FROM {table} WHERE user_id IN ({placeholders})", list(user_ids)
+            ).fetchall()
+        return {user_id: (version, data) for user_id, version, data in rows}
+
+    def _records(self, table, user_ids=None):
+        with self.lock:
+            rows = self._read(table, user_ids)
+        return {user_id: json.loads(data) for user_id, (version, data) in rows.items()}
+
+    def players(self):
+        return self._records("players")
+
+    # Records in batches of (user_id, record), paged by user_id
+    def _iter_records(self, table, batch_size):
+        last_id = ""
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT user_id, data FROM {table} WHERE user_id > ? ORDER BY user_id LIMIT ?", (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield [(user_id, json.loads(data)) for user_id, data in rows]
+            last_id = rows[-1][0]
+
+    def iter_players(self, batch_size):
+        return self._iter_records("players", batch_size)
+
+    # Both tables read in one transaction - WAL gives it a fixed view of the
+    # database without holding up other processes' writes
+    def snapshot(self):
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                rows = {table: self._read(table) for table in self.RECORDS}
+            finally:
+                self.conn.execute("COMMIT")
+        return tuple({user_id: json.loads(data) for user_id, (version, data) in rows[table].items()} for table in self.RECORDS)
+
+    # Replace every record, e.g. from a backup. Versions keep counting up, so a
+    # concurrent update that read the old record fails and re-reads.
+    def restore(self, players, stats):
+        with self.lock, self.conn:
+            for table, records in zip(self.RECORDS, (players, stats)):
+                self.conn.execute(
+                    f"DELETE FROM {table} WHERE user_id NOT IN (SELECT value FROM json_each(?))", (json.dumps(list(records)),)
+                )
+                self.conn.executemany(
+                    f"INSERT INTO {table} (user_id, version, data) VALUES (?, 1, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET version = version + 1, data = excluded.data",
+                    [(user_id, json.dumps(record)) for user_id, record in records.items()]
+                )
+
+    def iter_stats(self, batch_size):
+        return self._iter_records("stats", batch_size)
+
+    def stats(self):
+        return self._records("stats")
+
+    def player(self, user_id):
+        return self._records("players", [user_id]).get(user_id)
+
+    def user_stats(self, user_id):
+        return self._records("stats", [user_id]).get(user_id)
+
+    def update(self, user_ids, fn, stats=False):
+        tables = ("players", "stats") if stats else ("players",)
+
+        for attempt in range(UPDATE_RETRIES):
+            with self.lock:
+                current = {table: self._read(table, user_ids) for table in tables}
+                records = {
+                    table: {
+                        user_id: json.loads(current[table][user_id][1]) if user_id in current[table] else self.RECORDS[table]()
+                        for user_id in user_ids
+                    }
+                    for table in tables
+                }
+                result = fn(records["players"], records.get("stats", {}))
+
+                try:
+                    with self.conn:
+                        for table in tables:
+                            self._write(table, current[table], records[table])
+                except (StoreConflict, sqlite3.IntegrityError):
+                    # Another process got there first - start over from its version
+                    continue
+                return result
+
+        raise StoreConflict(f"Gave up updating {', '.join(user_ids)} after {UPDATE_RETRIES} attempts")
+
+    def _write(self, table, current, records):
+        for user_id, record in records.items():
+            data = json.dumps(record)
+            if user_id not in current:
+                # A record created by someone else meanwhile fails the primary key
+                self.conn.execute(f"INSERT INTO {table} (user_id, version, data) VALUES (?, 1, ?)", (user_id, data))
+                continue
+
+            version, old_data = current[user_id]
+            if data == old_data:
+                continue
+            cursor = self.conn.execute(
+                f"UPDATE {table} SET version = version + 1, data = ? WHERE user_id = ? AND version = ?",
+                (data, user_id, version)
+            )
+            if cursor.rowcount != 1:
+                raise StoreConflict(user_id)
+
+    def acquire_lock(self, name, owner, ttl):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO locks (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE locks.owner = excluded.owner OR locks.expires_at < ?",
+                (name, owner, now + ttl, now)
+            )
+            row = self.conn.execute("SELECT owner FROM locks WHERE name = ?", (name,)).fetchone()
+        return row[0] == owner
+
+    def renew_locks(self, names, owner, ttl):
+        if not names:
+            return
+        expires_at = time.time() + ttl
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE locks SET expires_at = ? WHERE name = ? AND owner = ?",
+                [(expires_at, name, owner) for name in names]
+            )
+
+    def release_lock(self, name, owner):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner))
+
+    def held_locks(self, prefix):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT name FROM locks WHERE substr(name, 1, ?) = ? AND expires_at > ?", (len(prefix), prefix, time.time())
+            ).fetchall()
+        return [name for name, in rows]
+
+    # Every update is already committed - nothing to write out
+    def flush(self):
+        pass
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+# write_behind only applies to JSON stores - tools reading files a running bot
+# writes to turn it off so every read sees the latest file
+def open_store(backend=STORE_BACKEND, guild_id=None, write_behind=STORE_FLUSH_INTERVAL > 0):
+    if backend == "json":
+        if guild_id is None:
+            return JsonStore(write_behind=write_behind)
+        return JsonStore(partition_path(PLAYER_DATA_FILE, guild_id), partition_path(BLACKJACK_DATA_FILE, guild_id), write_behind)
+    if backend == "sqlite":
+        return SqliteStore(STORE_DB_FILE if guild_id is None else partition_path(STORE_DB_FILE, guild_id))
+    raise ValueError(f"Unknown BLACKJACK_STORE {backend!r}, expected json or sqlite")
+
+# Guild ids with a partition on disk for a backend
+def partition_ids(backend=STORE_BACKEND):
+    root, ext = os.path.splitext(PLAYER_DATA_FILE if backend == "json" else STORE_DB_FILE)
+    guild_ids = []
+    for path in glob.glob(f"{glob.escape(root)}-*{ext}"):
+        suffix = path[len(root) + 1:len(path) - len(ext)]
+        if suffix.isdigit():
+            guild_ids.append(int(suffix))
+    return sorted(guild_ids)
+
+# The global store holds the shared game locks and, unless guild economies are
+# on, everyone's balances
+store = open_store()
+
+# Guild partitions, opened on first use
+partitions = {}
+partitions_lock = threading.Lock()
+
+# The store holding balances and stats for a guild (None for DMs)
+def store_for(guild_id):
+    if not GUILD_ECONOMIES or guild_id is None:
+        return store
+    with partitions_lock:
+        if guild_id not in partitions:
+            partitions[guild_id] = open_store(guild_id=guild_id)
+        return partitions[guild_id]
+
+# Every store holding balances as (guild_id, store) - the global one has no guild
+def all_stores():
+    guild_ids = partition_ids() if GUILD_ECONOMIES else []
+    return [(None, store)] + [(guild_id, store_for(guild_id)) for guild_id in guild_ids]
+
+# Write out every store's buffered changes
+def flush_stores():
+    with partitions_lock:
+        stores = [store] + list(partitions.values())
+    for partition in stores:
+        partition.flush()
+
+# A player's record, or a fresh one if they have never played
+def get_player(user_id, guild_id=None):
+    return store_for(guild_id).player(str(user_id)) or new_player()
+
+# A player's blackjack stats, or None if they have never finished a game
+def get_stats(user_id, guild_id=None):
+    return store_for(guild_id).user_stats(str(user_id))
+
+# Take chips from a player if they can cover the amount, returning (success, balance)
+def debit_chips(user_id, amount, guild_id=None):
+    user_id = str(user_id)
+
+    def debit(players, stats):
+        player = players[user_id]
+        if player["chips"] < amount:
+            return False, player["chips"]
+        player["chips"] -= amount
+        return True, player["chips"]
+
+    return store_for(guild_id).update([user_id], debit)
+
+# Add chips to a player, returning the new balance
+def grant_chips(user_id, amount, guild_id=None):
+    user_id = str(user_id)
+
+    def grant(players, stats):
+        players[user_id]["chips"] += amount
+        return players[user_id]["chips"]
+
+    return store_for(guild_id).update([user_id], grant)
+
+# Daily chip bonus
+DAILY_CHIPS = 200
+
+# Give the daily bonus unless it was already claimed today, returning (claimed, balance)
+def claim_daily(user_id, guild_id=None):
+    user_id = str(user_id)
+
+    def claim(players, stats):
+        player = players[user_id]
+        today = datetime.date.today().isoformat()
+        last_daily = player.get("last_daily")
+        if last_daily and last_daily.startswith(today):
+            return False, player["chips"]
+
+        player["chips"] += DAILY_CHIPS
+        player["last_daily"] = datetime.datetime.now().isoformat()
+        return True, player["chips"]
+
+    return store_for(guild_id).update([user_id], claim)
@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from events import start_event_log, stop_event_log
+from engine import ACTION_CODES, ACTIONS, BlackjackGame, calculate_score
+from history import HandHistory
+from settlement import settle_game
+from storage import STORE_BACKEND, debit_chips, flush_stores, get_player, grant_chips, store
+
+# Play the bot's game engine from a terminal or a script, against the same
+# balance store and hand history, with no bot token or network:
+#
+#   python -m terminal                       play interactively
+#   python -m terminal --batch < games.txt   one game per line, JSON lines out
+#
+# A batch line is the opening bet, then the moves as ACTION_CODES letters
+# (H hit, S stand, D double, P split, F forfeit), then optionally a seed to
+# deal a known deck, e.g. "50 PHSS 1234". Moves the bot would turn down, and
+# moves left over once the game is finished, are skipped and listed in the
+# result; a game the moves don't finish is stood on.
+#
+# Only the SQLite store (BLACKJACK_STORE=sqlite) is shared between processes.
+# The json store keeps its own copy of the balances in each process and writes
+# the whole copy back, so playing from here next to a running bot would
+# overwrite one side's changes - with it, stop the bot and pass --bot-stopped.
+TERMINAL_USER_ID = int(os.getenv('TERMINAL_USER_ID', '1'))
+TERMINAL_BET = 50
+
+# Held like the bot's game locks while a game is in flight. With the SQLite
+# store a running bot won't start a game for the same player, and audits skip
+# its balance.
+GAME_LOCK_TTL = 60
+
+OWNER = f"terminal:{os.getpid()}"
+
+# One game for a player in a guild (None for DMs or the global economy). It
+# takes the bet, deals, and asks `choose(game)` for each move until the game is
+# done, turning down moves the bot would. Returns (game, settlement, skipped
+# ACTION_CODES letters), or raises ValueError when the bet can't be covered.
+class TerminalGame:
+    def __init__(self, user_id, guild_id, history):
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.history = history
+
+    def play(self, bet, choose, seed=None):
+        if bet <= 0:
+            raise ValueError("the bet must be positive")
+        lock = f"game:{self.user_id}"
+        if not store.acquire_lock(lock, OWNER, GAME_LOCK_TTL):
+            raise ValueError("this player already has a game in progress")
+        try:
+            success, chips = debit_chips(self.user_id, bet, self.guild_id)
+            if not success:
+                raise ValueError(f"not enough chips for a {bet} chip bet, balance is {chips}")
+            return self._play(BlackjackGame(self.user_id, bet, seed), choose)
+        finally:
+            store.release_lock(lock, OWNER)
+
+    def _play(self, game, choose):
+        skipped = ""
+        hands = game.dealt_result()
+        while not hands:
+            action = choose(game)
+            if action not in game.moves() or not self._cover(game, action):
+                skipped += ACTION_CODES.get(action, action)
+                continue
+            game.version += 1
+            game.actions += ACTION_CODES[action]
+            hands = game.play(action)
+
+        settlement = settle_game(self.user_id, hands, self.guild_id)
+        if self.history:
+            self.history.record_games([(settlement, game.hands(), game.dealer_hand, game.actions, game.seed)])
+        return game, settlement, skipped
+
+    # Doubling and splitting put up a second bet the size of the hand's
+    def _cover(self, game, action):
+        if action not in ("double", "split"):
+            return True
+        return debit_chips(self.user_id, game.active_bet(), self.guild_id)[0]
+
+def show_hand(cards, hidden=False):
+    if hidden:
+        return f"{cards[0]} ❓ ({calculate_score(cards[:1])} + ?)"
+    return f"{''.join(cards)} ({calculate_score(cards)})"
+
+def game_result(game, settlement, skipped):
+    return {
+        "user_id": settlement.user_id,
+        "seed": game.seed,
+        "actions": game.actions,
+        "skipped": skipped,
+        "hands": [
+            {"cards": "".join(hand), "total": calculate_score(hand), "bet": bet, "result": result, "net": net}
+            for hand, (bet, outcome), result, net in zip(game.hands(), settlement.hands, settlement.results, settlement.nets)
+        ],
+        "dealer": {"cards": "".join(game.dealer_hand), "total": calculate_score(game.dealer_hand)},
+        "net": settlement.net,
+        "chips": settlement.chips,
+    }
+
+# The moves on a batch line, then stand until the game is done. Whatever is
+# left once the game finishes stays in `codes`.
+class Script:
+    def __init__(self, codes):
+        self.codes = list(codes)
+
+    def __call__(self, game):
+        code = self.codes.pop(0) if self.codes else "S"
+        return ACTIONS.get(code.upper(), code)
+
+def parse_line(line):
+    fields = line.split()
+    if not 1 <= len(fields) <= 3:
+        raise ValueError("expected: bet [moves] [seed]")
+    if not fields[0].isdigit():
+        raise ValueError(f"the bet must be a whole number, not {fields[0]!r}")
+    bet = int(fields[0])
+    codes = fields[1] if len(fields) > 1 else ""
+    seed = int(fields[2]) if len(fields) > 2 else None
+    return bet, codes, seed
+
+def run_batch(player, lines, out):
+    games = errors = 0
+    started = time.perf_counter()
+    for number, line in enumerate(lines, 1):
+        if not line.strip() or line.startswith("#"):
+            continue
+        try:
+            bet, codes, seed = parse_line(line)
+            script = Script(codes)
+            game, settlement, skipped = player.play(bet, script, seed)
+            result = game_result(game, settlement, skipped + "".join(script.codes))
+            games += 1
+        except ValueError as e:
+            result = {"line": number, "error": str(e)}
+            errors += 1
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    elapsed = time.perf_counter() - started
+    rate = f", {games / elapsed:,.0f} games/s" if games and elapsed else ""
+    print(f"{games} games played, {errors} lines rejected in {elapsed:.2f}s{rate}", file=sys.stderr)
+    return errors
+
+def prompt_move(game):
+    if game.split:
+        for index, (hand, bet) in enumerate(zip(game.hands(), game.split["bets"])):
+            marker = " <" if index == game.split["active"] else ""
+            print(f"  Hand {index + 1} ({bet}): {show_hand(hand)}{marker}")
+    else:
+        print(f"  You:    {show_hand(game.player_hand)}")
+    print(f"  Dealer: {show_hand(game.dealer_hand, hidden=True)}")
+    moves = game.moves()
+    try:
+        choice = input(" / ".join(f"[{ACTION_CODES[move]}] {move}" for move in moves) + " > ").strip()
+    except EOFError:
+        # The bet is already down, so walking away forfeits it. Split hands
+        # can't be forfeited and stand instead, one prompt at a time, so the
+        # game still ends.
+        return "forfeit" if "forfeit" in moves else "stand"
+    return ACTIONS.get(choice.upper(), choice.lower())
+
+def run_interactive(player):
+    while True:
+        chips = get_player(player.user_id, player.guild_id)["chips"]
+        try:
+            answer = input(f"\nYou have {chips} chips. Bet (Enter for {TERMINAL_BET}, q to quit): ").strip()
+        except EOFError:
+            return
+        if answer.lower() == "q":
+            return
+        try:
+            bet = int(answer) if answer else TERMINAL_BET
+        except ValueError:
+            print("Bets are whole numbers of chips")
+            continue
+        try:
+            game, settlement, skipped = player.play(bet, prompt_move)
+        except ValueError as e:
+            print(f"Can't play: {e}")
+            continue
+        for hand, result in zip(game.hands(), settlement.results):
+            print(f"  {show_hand(hand)} {result.upper()}")
+        print(f"  Dealer: {show_hand(game.dealer_hand)}")
+        print(f"  {settlement.net:+} chips")
+
+def main():
+    parser = argparse.ArgumentParser(description="Play blackjack from a terminal against the bot's storage, without Discord")
+    parser.add_argument("--batch", action="store_true", help="read games from stdin and write JSON lines of results")
+    parser.add_argument("--user", type=int, default=TERMINAL_USER_ID, help="player id to play as")
+    parser.add_argument("--guild", type=int, help="guild economy to play in (with GUILD_ECONOMIES=1)")
+    parser.add_argument("--grant", type=int, default=0, metavar="CHIPS", help="give the player chips first, logged as an admin grant")
+    parser.add_argument("--no-history", action="store_true", help="don't log hands to the hand history")
+    parser.add_argument("--events", default="", metavar="PATH", help="write game events as JSON lines (- for stderr), as the bot does")
+    parser.add_argument("--bot-stopped", action="store_true", help="confirm the bot isn't running, to play against the json store")
+    args = parser.parse_args()
+    if STORE_BACKEND == "json" and not args.bot_stopped:
+        parser.error("BLACKJACK_STORE=json can't be shared with a running bot - stop the bot and pass --bot-stopped, or use BLACKJACK_STORE=sqlite")
+
+    start_event_log(args.events)
+    history = HandHistory()
+    player = TerminalGame(str(args.user), args.guild, None if args.no_history else history)
+    if args.grant:
+        grant_chips(player.user_id, args.grant, args.guild)
+        history.record_grant(args.user, args.guild, "admin", args.grant)
+
+    try:
+        if args.batch:
+            errors = run_batch(player, sys.stdin, sys.stdout)
+        else:
+            errors = 0
+            run_interactive(player)
+    finally:
+        flush_stores()
+        history.close()
+        stop_event_log()
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    main()
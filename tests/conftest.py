@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The bot's modules live at the repo root and open their data files relative
+# to the working directory, so tests run from a scratch directory and never
+# touch a real player_data.json or leaderboards.db
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="blackjack-tests-"))
@@ -0,0 +1,19 @@
+from engine import BlackjackGame, CARD_FROM_INDEX, CARD_INDEX
+
+RANKS = "A23456789TJQK"
+
+# Cards by rank letter and suit number (0 spades, 1 hearts, 2 diamonds, 3 clubs)
+def card(rank, suit=0):
+    return CARD_FROM_INDEX[suit * 13 + RANKS.index(rank)]
+
+def cards(ranks):
+    return [card(rank, i % 4) for i, rank in enumerate(ranks)]
+
+def ranks(hand):
+    return "".join(RANKS[CARD_INDEX[card] % 13] for card in hand)
+
+# A game dealt the given hands, drawing `draws` in order after the deal
+def dealt_game(player, dealer, draws, bet=50):
+    return BlackjackGame.from_snapshot(
+        1, 1, 0, bet, cards(player), cards(dealer), list(reversed(cards(draws))), False, False
+    )
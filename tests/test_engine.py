@@ -0,0 +1,115 @@
+import random
+
+import pytest
+
+import engine
+from engine import ACTION_CODES, BlackjackGame, replay
+from helpers import dealt_game, ranks
+
+
+def test_split_deals_a_second_card_to_each_hand():
+    game = dealt_game("88", "T7", "35")
+    assert "split" in game.moves()
+
+    assert game.play("split") is None
+    assert [ranks(hand) for hand in game.hands()] == ["83", "85"]
+    assert game.split["bets"] == [50, 50]
+    assert game.split["active"] == 0
+    assert "forfeit" not in game.moves()
+
+
+def test_split_hands_settle_against_the_dealer():
+    game = dealt_game("88", "T7", "35T")
+    game.play("split")
+    game.play("hit")  # 8 3 T = 21, stays on the first hand
+    assert game.split["active"] == 0
+    assert game.play("stand") is None
+    assert game.split["active"] == 1
+    assert game.play("stand") == [(50, "win"), (50, "lose")]
+
+
+def test_bust_moves_on_to_the_next_hand():
+    game = dealt_game("88", "T7", "55K")
+    game.play("split")
+    assert game.play("hit") is None
+    assert game.split["active"] == 1
+    assert game.play("stand") == [(50, "lose"), (50, "lose")]
+
+
+def test_resplit_a_pair_dealt_to_a_split_hand():
+    game = dealt_game("88", "T7", "8229")
+    game.play("split")
+    assert "split" in game.moves()
+
+    game.play("split")
+    assert [ranks(hand) for hand in game.hands()] == ["82", "89", "82"]
+    assert game.split["bets"] == [50, 50, 50]
+    assert game.split["active"] == 0
+
+
+def test_resplit_stops_at_the_hand_limit(monkeypatch):
+    monkeypatch.setattr(engine, "SPLIT_MAX_HANDS", 2)
+    game = dealt_game("88", "T7", "82")
+    game.play("split")
+    assert "split" not in game.moves()
+
+
+def test_double_after_split_doubles_only_the_active_hand():
+    game = dealt_game("88", "T7", "35T")
+    game.play("split")
+    assert "double" in game.moves()
+    assert game.active_bet() == 50
+
+    assert game.play("double") is None
+    assert ranks(game.hands()[0]) == "83T"
+    assert game.split["bets"] == [100, 50]
+    assert game.split["active"] == 1
+    assert game.play("stand") == [(100, "win"), (50, "lose")]
+
+
+def test_double_after_split_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(engine, "DOUBLE_AFTER_SPLIT", False)
+    game = dealt_game("88", "T7", "35")
+    game.play("split")
+    assert "double" not in game.moves()
+
+
+def test_split_aces_take_one_card_each(monkeypatch):
+    monkeypatch.setattr(engine, "SPLIT_ACES_ONE_CARD", True)
+    game = dealt_game("AA", "T7", "K5")
+    assert game.play("split") == [(50, "blackjack"), (50, "lose")]
+
+
+def test_split_aces_dealt_an_ace_resplit_only_when_allowed(monkeypatch):
+    monkeypatch.setattr(engine, "SPLIT_ACES_ONE_CARD", True)
+    game = dealt_game("AA", "T7", "A5")
+    assert game.play("split") is not None
+
+    monkeypatch.setattr(engine, "RESPLIT_ACES", True)
+    game = dealt_game("AA", "T7", "A5KQ")
+    assert game.play("split") is None
+    assert game.moves() == ["stand", "split"]
+    assert game.play("split") == [(50, "blackjack"), (50, "blackjack"), (50, "lose")]
+    assert [ranks(hand) for hand in game.hands()] == ["AK", "AQ", "A5"]
+
+
+def test_forfeit_after_split_forfeits_every_hand():
+    game = dealt_game("88", "T7", "8229T")
+    game.play("split")
+    game.play("split")
+    game.play("double")
+    assert game.play("forfeit") == [(100, "forfeit"), (50, "forfeit"), (50, "forfeit")]
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_replay_matches_live_play(seed):
+    moves = random.Random(seed)
+    game = BlackjackGame(0, 50, seed)
+    actions = ""
+    hands = game.dealt_result()
+    while hands is None:
+        action = moves.choice(game.moves())
+        actions += ACTION_CODES[action]
+        hands = game.play(action)
+
+    assert replay(seed, 50, actions) == (hands, game.hands(), game.dealer_hand)
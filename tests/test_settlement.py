@@ -0,0 +1,39 @@
+import pytest
+
+from settlement import Settlement, settle_game
+from storage import STARTING_CHIPS
+
+
+@pytest.mark.parametrize("result, payout", [
+    ("blackjack", 250),
+    ("player_wins", 200),
+    ("dealer_bust", 200),
+    ("push", 100),
+    ("player_bust", 0),
+    ("dealer_wins", 0),
+    ("dealer_blackjack", 0),
+    ("forfeit", 0),
+])
+def test_single_hand_payouts(result, payout):
+    settlement = Settlement(1, [(100, result)])
+    assert settlement.payout == payout
+    assert settlement.net == payout - 100
+    assert settlement.bet_total == 100
+
+
+def test_split_hands_settle_on_their_own_bets():
+    settlement = Settlement(1, [(100, "win"), (50, "blackjack"), (50, "tie"), (50, "lose")])
+    assert settlement.nets == [100, 75, 0, -50]
+    assert settlement.bet_total == 250
+    assert settlement.payout == 375
+    assert (settlement.wins, settlement.losses) == (2, 1)
+
+
+def test_odd_blackjack_payouts_round_down():
+    assert Settlement(1, [(25, "blackjack")]).payout == 62
+
+
+def test_settle_game_pays_the_player():
+    settlement = settle_game(1001, [(100, "win"), (100, "lose")])
+    assert settlement.chips == STARTING_CHIPS + 200
+    assert settle_game(1001, [(50, "blackjack")]).chips == STARTING_CHIPS + 325
@@ -0,0 +1,78 @@
+from engine import encode_cards
+from gamestate import FLAG_DOUBLED_DOWN, FLAG_SPLIT, SNAPSHOT_HEADER, SNAPSHOT_SEED, ShardState, hand_history, pack_game, restore_games, unpack_game
+from helpers import cards, dealt_game
+from storage import get_player
+
+
+def game_state(game):
+    return (
+        game.game_id, game.version, game.bet_amount, game.player_hand, game.dealer_hand, game.deck,
+        game.game_over, game.doubled_down, game.split, game.actions, game.seed,
+    )
+
+
+def round_trip(game):
+    return unpack_game(game.user_id, game.version, pack_game(game))
+
+
+def test_round_trip_single_hand():
+    game = dealt_game("T6", "97", "5K")
+    game.seed = 12345
+    game.actions = "D"
+    game.play("double")
+    game.version = 3
+    assert game_state(round_trip(game)) == game_state(game)
+
+
+def test_round_trip_split_hands():
+    game = dealt_game("88", "T7", "8229T4")
+    game.seed = 2 ** 63 - 1
+    game.play("split")
+    game.play("split")
+    game.play("double")
+    game.actions = "PPD"
+    restored = round_trip(game)
+    assert restored.split == {"hands": game.split["hands"], "bets": [100, 50, 50], "active": 1}
+    assert game_state(restored) == game_state(game)
+
+    # The restored game plays on where the live one left off
+    assert restored.play("hit") == game.play("hit")
+    assert restored.hands() == game.hands()
+
+
+def test_legacy_two_hand_split():
+    player, dealer, deck = cards("88"), cards("T7"), cards("5K")
+    hand1, hand2 = cards("83"), cards("85")
+    packed = b"".join([
+        SNAPSHOT_HEADER.pack(7, 50, 50, FLAG_SPLIT | FLAG_DOUBLED_DOWN, 2),
+        encode_cards(player), encode_cards(dealer), encode_cards(deck),
+        encode_cards(hand1), encode_cards(hand2),
+        bytes([2]) + b"PS",
+        SNAPSHOT_SEED.pack(99),
+    ])
+
+    game = unpack_game(1, 4, packed)
+    assert game.split == {"hands": [hand1, hand2], "bets": [50, 50], "active": 1}
+    assert (game.game_id, game.version, game.bet_amount, game.doubled_down) == (7, 4, 50, True)
+    assert (game.actions, game.seed) == ("PS", 99)
+
+    # Written back in the current format, it reads the same
+    assert game_state(round_trip(game)) == game_state(game)
+
+
+def test_snapshot_from_before_actions_and_seeds():
+    packed = SNAPSHOT_HEADER.pack(7, 50, 0, 0, 0) + encode_cards(cards("T6")) + encode_cards(cards("97")) + encode_cards(cards("5K"))
+    game = unpack_game(1, 0, packed)
+    assert (game.player_hand, game.split, game.actions, game.seed) == (cards("T6"), None, "", None)
+
+
+def test_unreadable_snapshot_is_forfeited_and_deleted():
+    state = ShardState(99)
+    state.snapshot_store.write([(2001, 3, SNAPSHOT_HEADER.pack(7, 100, 0, 0, 0) + b"\x05\x01")], [])
+    restore_games(state)
+
+    assert state.active_games == {}
+    assert state.snapshot_store.read_all() == []
+    assert get_player(2001)["losses"] == 1
+    rows = hand_history.conn.execute("SELECT bet, result, net FROM hands WHERE user_id = 2001").fetchall()
+    assert [tuple(row) for row in rows] == [(100, "forfeit", -100)]